@@ -4,7 +4,6 @@ import argparse
 
 from dotenv import load_dotenv
 
-from src.handlers import handle_fixissue, handle_fixpr, handle_review
 from src.logger import setup_logger
 
 
@@ -16,22 +15,27 @@ def main() -> None:
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     fixissue_parser = subparsers.add_parser("fixissue", help="Process GitHub issue")
-    fixissue_parser.add_argument("issue_url", help="GitHub issue URL")
+    fixissue_parser.add_argument("url", metavar="issue_url", help="GitHub issue URL")
+    fixissue_parser.set_defaults(handler="handle_fixissue")
 
     review_parser = subparsers.add_parser("review", help="Review pull request")
-    review_parser.add_argument("pr_url", help="GitHub pull request URL")
+    review_parser.add_argument("url", metavar="pr_url", help="GitHub pull request URL")
+    review_parser.set_defaults(handler="handle_review")
 
     fixpr_parser = subparsers.add_parser("fixpr", help="Fix pull request")
-    fixpr_parser.add_argument("pr_url", help="GitHub pull request URL")
+    fixpr_parser.add_argument("url", metavar="pr_url", help="GitHub pull request URL")
+    fixpr_parser.set_defaults(handler="handle_fixpr")
 
     args = parser.parse_args()
 
-    if args.command == "fixissue":
-        handle_fixissue(args.issue_url)
-    elif args.command == "review":
-        handle_review(args.pr_url)
-    elif args.command == "fixpr":
-        handle_fixpr(args.pr_url)
+    # Heavy agent/GitHub imports are deferred until a command actually runs
+    from src import handlers
+    from src.code_agent import get_recursion_limit
+
+    # Fail on a missing agent limit before any GitHub or clone work
+    get_recursion_limit()
+
+    getattr(handlers, args.handler)(args.url)
 
 
 if __name__ == "__main__":
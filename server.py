@@ -1,14 +1,18 @@
 """FastAPI webhook server for tishcode."""
 
-import hashlib
 import hmac
+import json
 import os
-from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+import threading
+from collections.abc import AsyncGenerator, Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
 
 from dotenv import load_dotenv
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request
 
+from src.code_agent import get_recursion_limit
 from src.db import (
     get_fix_attempts,
     increment_fix_attempts,
@@ -18,6 +22,7 @@ from src.db import (
 from src.github_utils import (
     are_all_workflows_completed,
     get_pull_request,
+    invalidate_pull_request,
     parse_pr_url,
     setup_github_access,
 )
@@ -26,30 +31,72 @@ from src.logger import setup_logger
 
 load_dotenv()
 
+logger = setup_logger()
+
 WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
 if not WEBHOOK_SECRET:
     raise RuntimeError("Missing GITHUB_WEBHOOK_SECRET in .env")
+WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode("utf-8")
+# A digest name keeps HMAC inside OpenSSL's accelerated implementation.
+# Keyed once; each request clones it instead of redoing the key schedule
+_HMAC_TEMPLATE = hmac.new(WEBHOOK_SECRET_BYTES, digestmod="sha256")
 
 _max_retries = os.getenv("TC_MAX_RETRIES")
 if not _max_retries:
     raise RuntimeError("Missing TC_MAX_RETRIES in .env")
 MAX_RETRIES = int(_max_retries)
 
+# Read when the server starts, so a missing limit fails here, not in a job
+get_recursion_limit()
+
+WebhookResponse = dict[str, str | bool]
+
+# Caps concurrent agent runs so bursts queue up instead of piling on threads
+BACKGROUND_WORKERS = 4
+_executor = ThreadPoolExecutor(
+    max_workers=BACKGROUND_WORKERS, thread_name_prefix="webhook"
+)
+
+
+# PR jobs currently running, so duplicate events for the same PR are dropped
+_inflight: set[tuple[str, str, str, int, str]] = set()
+_inflight_lock = threading.Lock()
+
+
+@contextmanager
+def claim_pr(
+    job: str, owner: str, repo: str, pr_number: int, head_sha: str = ""
+) -> Generator[bool, Any, None]:
+    """Claim a PR for a job; yields False if the same job is already running.
+
+    Reviews pass head_sha, so a push during a review still gets its own review.
+    """
+    key = (job, owner, repo, pr_number, head_sha)
+    with _inflight_lock:
+        claimed = key not in _inflight
+        _inflight.add(key)
+    try:
+        yield claimed
+    finally:
+        if claimed:
+            with _inflight_lock:
+                _inflight.discard(key)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    logger = setup_logger()
     logger.info("tishcode webhook server started")
     logger.info(f"Max fix retries: {MAX_RETRIES}")
     yield
+    _executor.shutdown(wait=False, cancel_futures=True)
     logger.info("tishcode webhook server stopped")
 
 
 app = FastAPI(title="tishcode webhook server", lifespan=lifespan)
 
 
-def verify_github_signature(body: bytes, sig_header: str | None) -> None:
-    """Verify GitHub webhook signature."""
+def verify_github_signature(mac: hmac.HMAC, sig_header: str | None) -> None:
+    """Verify GitHub webhook signature against an HMAC fed with the body."""
     if not sig_header:
         raise HTTPException(status_code=400, detail="Missing X-Hub-Signature-256")
 
@@ -61,17 +108,17 @@ def verify_github_signature(body: bytes, sig_header: str | None) -> None:
     if algo != "sha256":
         raise HTTPException(status_code=400, detail="Unsupported signature algorithm")
 
-    assert WEBHOOK_SECRET is not None
-    mac = hmac.new(WEBHOOK_SECRET.encode("utf-8"), msg=body, digestmod=hashlib.sha256)
-    expected = mac.hexdigest()
+    try:
+        their_digest = bytes.fromhex(their_sig)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Bad X-Hub-Signature-256 format")
 
-    if not hmac.compare_digest(expected, their_sig):
+    if not hmac.compare_digest(mac.digest(), their_digest):
         raise HTTPException(status_code=401, detail="Invalid signature")
 
 
 def process_issue_opened(issue_url: str) -> None:
     """Background task: issues/opened - handle_fixissue."""
-    logger = setup_logger()
     logger.info(f"[webhook] Processing new issue: {issue_url}")
     try:
         pr_url = handle_fixissue(issue_url)
@@ -82,139 +129,176 @@ def process_issue_opened(issue_url: str) -> None:
 
 def process_pr_review_submitted(pr_url: str) -> None:
     """Background task: pull_request_review/submitted - handle_fixpr."""
-    logger = setup_logger()
     logger.info(f"[webhook] Processing PR review submitted: {pr_url}")
 
     try:
         owner, repo, pr_number = parse_pr_url(pr_url)
-
-        # Check if PR processing is already completed
-        if is_pr_completed(owner, repo, pr_number):
-            logger.info(f"[webhook] PR {pr_url} already completed, skipping fixpr")
-            return
-
-        # Check retry limit
-        attempts = get_fix_attempts(owner, repo, pr_number)
-        if attempts >= MAX_RETRIES:
-            logger.warning(
-                f"[webhook] PR {pr_url} max retries ({MAX_RETRIES}) "
-                "reached, skipping fixpr"
+        with claim_pr("fixpr", owner, repo, pr_number) as claimed:
+            if not claimed:
+                logger.info(
+                    f"[webhook] fixpr already running for PR {pr_url}, skipping"
+                )
+                return
+
+            # Check if PR processing is already completed
+            if is_pr_completed(owner, repo, pr_number):
+                logger.info(f"[webhook] PR {pr_url} already completed, skipping fixpr")
+                return
+
+            # Check retry limit
+            attempts = get_fix_attempts(owner, repo, pr_number)
+            if attempts >= MAX_RETRIES:
+                logger.warning(
+                    f"[webhook] PR {pr_url} max retries ({MAX_RETRIES}) "
+                    "reached, skipping fixpr"
+                )
+                mark_pr_completed(owner, repo, pr_number)
+                return
+
+            # Run fixpr and increment counter
+            logger.info(
+                f"[webhook] Running fixpr for PR: {pr_url} (attempt {attempts + 1})"
             )
-            mark_pr_completed(owner, repo, pr_number)
-            return
-
-        # Run fixpr and increment counter
-        logger.info(
-            f"[webhook] Running fixpr for PR: {pr_url} (attempt {attempts + 1})"
-        )
-        increment_fix_attempts(owner, repo, pr_number)
-        handle_fixpr(pr_url)
-        logger.info(f"[webhook] Fixed PR: {pr_url}")
+            increment_fix_attempts(owner, repo, pr_number)
+            handle_fixpr(pr_url)
+            logger.info(f"[webhook] Fixed PR: {pr_url}")
 
     except Exception as e:
         logger.error(f"[webhook] Failed to fix PR: {e}")
 
 
-def process_check_suite_completed(pr_url: str) -> None:
+def process_check_suite_completed(pr_url: str, head_sha: str) -> None:
     """Background task: check_suite/completed - handle_review."""
-    logger = setup_logger()
     logger.info(f"[webhook] Processing check_suite completed for PR: {pr_url}")
 
     try:
         owner, repo, pr_number = parse_pr_url(pr_url)
+        with claim_pr("review", owner, repo, pr_number, head_sha) as claimed:
+            if not claimed:
+                logger.info(
+                    f"[webhook] review of {head_sha} already running for PR {pr_url}, "
+                    "skipping"
+                )
+                return
+
+            # Check if PR processing is already completed
+            if is_pr_completed(owner, repo, pr_number):
+                logger.info(f"[webhook] PR {pr_url} already completed, skipping review")
+                return
+
+            # Check workflows of the event's commit; no PR fetch needed for that
+            _, gh_repo = setup_github_access(owner, repo)
+            if not are_all_workflows_completed(gh_repo, head_sha):
+                logger.info(
+                    f"[webhook] Not all workflows completed for PR {pr_url}, skipping"
+                )
+                return
+
+            # A newer push gets its own check_suite event, so stale ones are dropped.
+            # Refetch so the head is current; handle_review then reuses this copy.
+            invalidate_pull_request(gh_repo, pr_number)
+            pull_request = get_pull_request(gh_repo, pr_number)
+            if pull_request.head.sha != head_sha:
+                logger.info(
+                    f"[webhook] PR {pr_url} head moved past {head_sha}, skipping"
+                )
+                return
+
+            # Run review
+            logger.info(f"[webhook] Running review for PR: {pr_url}")
+            approved = handle_review(pr_url)
+
+            if approved:
+                logger.info(f"[webhook] PR {pr_url} approved, marking as completed")
+                mark_pr_completed(owner, repo, pr_number)
 
-        # Check if PR processing is already completed
-        if is_pr_completed(owner, repo, pr_number):
-            logger.info(f"[webhook] PR {pr_url} already completed, skipping review")
-            return
+    except Exception as e:
+        logger.error(f"[webhook] Failed to review PR: {e}")
 
-        # Get PR to check all workflows status
-        _, gh_repo = setup_github_access(owner, repo)
-        pull_request = get_pull_request(gh_repo, pr_number)
 
-        # Check if all workflows are completed
-        if not are_all_workflows_completed(gh_repo, pull_request.head.sha):
-            logger.info(
-                f"[webhook] Not all workflows completed for PR {pr_url}, skipping"
-            )
-            return
+def on_issue_opened(payload: dict[str, Any]) -> WebhookResponse:
+    """Handle issue opened - fixissue."""
+    issue_url = payload.get("issue", {}).get("html_url")
+    if issue_url:
+        logger.info(f"[webhook] Issue opened: {issue_url}")
+        _executor.submit(process_issue_opened, issue_url)
+        return {"ok": True, "message": "Processing issue in background"}
+    return {"ok": False, "message": "No issue URL in payload"}
 
-        # Run review
-        logger.info(f"[webhook] Running review for PR: {pr_url}")
-        approved = handle_review(pr_url)
 
-        if approved:
-            logger.info(f"[webhook] PR {pr_url} approved, marking as completed")
-            mark_pr_completed(owner, repo, pr_number)
+def on_review_submitted(payload: dict[str, Any]) -> WebhookResponse:
+    """Handle pull request review submitted - fixpr."""
+    pr_url = payload.get("pull_request", {}).get("html_url")
+    review_state = payload.get("review", {}).get("state")
+
+    if pr_url:
+        logger.info(f"[webhook] PR review submitted: {pr_url} (state: {review_state})")
+        _executor.submit(process_pr_review_submitted, pr_url)
+        return {"ok": True, "message": "Processing PR fix in background"}
+
+    return {"ok": False, "message": "No PR URL in payload"}
+
+
+def on_check_suite_completed(payload: dict[str, Any]) -> WebhookResponse:
+    """Handle check_suite completed - review."""
+    check_suite = payload.get("check_suite", {})
+    pull_requests = check_suite.get("pull_requests", [])
+
+    if not pull_requests:
+        logger.debug("[webhook] check_suite has no PRs, ignoring")
+        return {"ok": True, "message": "No PRs in check_suite"}
+
+    # Process first PR (usually there's only one)
+    pr_data = pull_requests[0]
+    pr_number = pr_data.get("number")
+    repo_data = payload.get("repository", {})
+    pr_url = f"{repo_data.get('html_url')}/pull/{pr_number}"
+
+    logger.info(f"[webhook] check_suite completed for PR: {pr_url}")
+    _executor.submit(process_check_suite_completed, pr_url, check_suite["head_sha"])
+    return {"ok": True, "message": "Processing review in background"}
 
-    except Exception as e:
-        logger.error(f"[webhook] Failed to review PR: {e}")
+
+# (event, action) -> handler
+_DISPATCH: dict[tuple[str, str], Callable[[dict[str, Any]], WebhookResponse]] = {
+    ("issues", "opened"): on_issue_opened,
+    ("pull_request_review", "submitted"): on_review_submitted,
+    ("check_suite", "completed"): on_check_suite_completed,
+}
+_DISPATCH_EVENTS = {event for event, _ in _DISPATCH}
 
 
 @app.post("/webhook")
-async def github_webhook(
-    request: Request, background_tasks: BackgroundTasks
-) -> dict[str, str | bool]:
+async def github_webhook(request: Request) -> WebhookResponse:
     """Handle GitHub webhook events."""
-    body = await request.body()
-    verify_github_signature(body, request.headers.get("X-Hub-Signature-256"))
+    # Hash chunks as they arrive so the digest is ready once the body is read
+    mac = _HMAC_TEMPLATE.copy()
+    body = bytearray()
+    async for chunk in request.stream():
+        mac.update(chunk)
+        body += chunk
+    verify_github_signature(mac, request.headers.get("X-Hub-Signature-256"))
 
     event = request.headers.get("X-GitHub-Event", "")
-    payload = await request.json()
-    action = payload.get("action")
-
-    logger = setup_logger()
 
     # GitHub ping event for webhook setup
     if event == "ping":
         logger.info("[webhook] Ping received")
         return {"ok": True, "message": "pong"}
 
-    # Handle issue opened - fixissue
-    if event == "issues" and action == "opened":
-        issue_url = payload.get("issue", {}).get("html_url")
-        if issue_url:
-            logger.info(f"[webhook] Issue opened: {issue_url}")
-            background_tasks.add_task(process_issue_opened, issue_url)
-            return {"ok": True, "message": "Processing issue in background"}
-        return {"ok": False, "message": "No issue URL in payload"}
-
-    # Handle pull request review submitted - fixpr
-    if event == "pull_request_review" and action == "submitted":
-        pr_url = payload.get("pull_request", {}).get("html_url")
-        review_state = payload.get("review", {}).get("state")
-
-        if pr_url:
-            logger.info(
-                f"[webhook] PR review submitted: {pr_url} (state: {review_state})"
-            )
-            background_tasks.add_task(process_pr_review_submitted, pr_url)
-            return {"ok": True, "message": "Processing PR fix in background"}
-
-        return {"ok": False, "message": "No PR URL in payload"}
-
-    # Handle check_suite completed - review
-    if event == "check_suite" and action == "completed":
-        check_suite = payload.get("check_suite", {})
-        pull_requests = check_suite.get("pull_requests", [])
-
-        if not pull_requests:
-            logger.debug("[webhook] check_suite has no PRs, ignoring")
-            return {"ok": True, "message": "No PRs in check_suite"}
+    # Events without any handler are dropped before parsing the payload
+    if event not in _DISPATCH_EVENTS:
+        logger.debug(f"[webhook] Ignored event: {event}")
+        return {"ok": True, "message": f"Event {event} ignored"}
 
-        # Process first PR (usually there's only one)
-        pr_data = pull_requests[0]
-        pr_number = pr_data.get("number")
-        repo_data = payload.get("repository", {})
-        pr_url = f"{repo_data.get('html_url')}/pull/{pr_number}"
-
-        logger.info(f"[webhook] check_suite completed for PR: {pr_url}")
-        background_tasks.add_task(process_check_suite_completed, pr_url)
-        return {"ok": True, "message": "Processing review in background"}
+    payload = json.loads(body)
+    action = payload.get("action")
 
-    # Ignore other events
-    logger.debug(f"[webhook] Ignored event: {event} action: {action}")
-    return {"ok": True, "message": f"Event {event}/{action} ignored"}
+    handler = _DISPATCH.get((event, action))
+    if handler is None:
+        logger.debug(f"[webhook] Ignored event: {event} action: {action}")
+        return {"ok": True, "message": f"Event {event}/{action} ignored"}
+    return handler(payload)
 
 
 @app.get("/health")
@@ -1,40 +1,103 @@
+import functools
+import json
 import logging
 import os
+from typing import Any
 
 from github.PullRequest import PullRequest
 from langchain_openai import ChatOpenAI
 
+from .gh_cache import TTLCache
+
 logger = logging.getLogger("tishcode")
 
+# Bound the diff in the fixpr prompt; that agent can read full files with tools
+MAX_PATCH_CHARS = 8000
+MAX_PATCH_FILES = 30
+
+# Keyed by head SHA, so entries never go stale; the TTL only bounds retention
+_changes_cache: TTLCache[list[dict[str, str | int]]] = TTLCache(
+    maxsize=128, ttl=60 * 60
+)
+
+
+def _bounded_patch(index: int, patch: str) -> str:
+    """Return the patch of the index-th PR file, cut to the prompt limits."""
+    if index >= MAX_PATCH_FILES:
+        return "Patch omitted: too many files in PR"
+    if len(patch) <= MAX_PATCH_CHARS:
+        return patch
+    omitted = len(patch) - MAX_PATCH_CHARS
+    return f"{patch[:MAX_PATCH_CHARS]}\n... (truncated, {omitted} more characters)"
+
 
 def get_pr_changes(pull_request: PullRequest) -> list[dict[str, str | int]]:
     """Extract code changes from pull request in structured format."""
-    files = pull_request.get_files()
-    changes: list[dict[str, str | int]] = []
-    for f in files:
-        changes.append({
-            "filename": f.filename,
-            "status": f.status,
-            "additions": f.additions,
-            "deletions": f.deletions,
-            "patch": f.patch if f.patch else "Binary file or no diff available",
-        })
+    key = (pull_request.base.repo.full_name, pull_request.number, pull_request.head.sha)
+    changes = _changes_cache.get(key)
+    if changes is None:
+        changes = [
+            {
+                "filename": f.filename,
+                "status": f.status,
+                "additions": f.additions,
+                "deletions": f.deletions,
+                "patch": f.patch if f.patch else "Binary file or no diff available",
+            }
+            for f in pull_request.get_files()
+        ]
+        _changes_cache.set(key, changes)
     return changes
 
 
+def format_pr_changes(
+    changes: list[dict[str, str | int]], bounded: bool = False
+) -> str:
+    """Render PR changes as per-file headers followed by their patches.
+
+    With bounded, patches are cut to MAX_PATCH_CHARS and MAX_PATCH_FILES.
+    """
+    return "\n".join(
+        f"=== {c['filename']} ({c['status']}, "
+        f"+{c['additions']} -{c['deletions']}) ===\n"
+        f"{_bounded_patch(i, str(c['patch'])) if bounded else c['patch']}\n"
+        for i, c in enumerate(changes)
+    )
+
+
+def summarize_pr_changes(changes: list[dict[str, str | int]]) -> str:
+    """Return a one-line total of files and changed lines for the prompt."""
+    additions = sum(int(c["additions"]) for c in changes)
+    deletions = sum(int(c["deletions"]) for c in changes)
+    return f"{len(changes)} files changed, +{additions} -{deletions}"
+
+
+def format_json(data: Any) -> str:
+    """Serialize data to JSON for embedding in an agent prompt."""
+    # Compact separators: the model doesn't need indentation, and it costs tokens
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def require_env(name: str) -> str:
+    """Return environment variable value, raising if it is not set."""
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} environment variable is not set")
+    return value
+
+
 def create_chat_model() -> ChatOpenAI:
     """Create LangChain ChatOpenAI model with validation of environment variables."""
-    model_id = os.getenv("TC_OPENAI_MODEL")
-    api_key = os.getenv("TC_OPENAI_API_KEY")
-    base_url = os.getenv("TC_OPENAI_BASE_URL")
+    return _build_chat_model(
+        require_env("TC_OPENAI_MODEL"),
+        require_env("TC_OPENAI_API_KEY"),
+        require_env("TC_OPENAI_BASE_URL"),
+    )
 
-    if not model_id:
-        raise ValueError("TC_OPENAI_MODEL environment variable is not set")
-    if not api_key:
-        raise ValueError("TC_OPENAI_API_KEY environment variable is not set")
-    if not base_url:
-        raise ValueError("TC_OPENAI_BASE_URL environment variable is not set")
 
+@functools.lru_cache(maxsize=1)
+def _build_chat_model(model_id: str, api_key: str, base_url: str) -> ChatOpenAI:
+    """Build the model once per configuration so its HTTP client is reused."""
     logger.info(f"Using model: {model_id}, base_url: {base_url}")
 
     return ChatOpenAI(
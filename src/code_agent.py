@@ -1,25 +1,41 @@
-import json
+import functools
 import logging
-import os
 from pathlib import Path
 from textwrap import dedent
+from typing import Any
 
 from github.Issue import Issue
 from github.PullRequest import PullRequest
+from github.PullRequestReview import PullRequestReview
 from langchain.agents import create_agent
+from langgraph.graph.state import CompiledStateGraph
 
-from .agent_utils import create_chat_model, get_pr_changes
-from .file_tools import create_file_tools
+from .agent_utils import (
+    create_chat_model,
+    format_pr_changes,
+    get_pr_changes,
+    require_env,
+)
+from .file_tools import FILE_TOOLS, create_file_tools
 
 logger = logging.getLogger("tishcode")
 
 
+@functools.cache
+def get_recursion_limit() -> int:
+    """Read TC_AGENT_TOOL_CALL_LIMIT once; entry points call this at startup."""
+    tool_call_limit = int(require_env("TC_AGENT_TOOL_CALL_LIMIT"))
+    return tool_call_limit * 2 + 10  # Each tool call = 2 steps
+
+
 SYSTEM_PROMPT_FIXISSUE = dedent("""\
     You are a code fixing agent. Your task is to analyze codebases
     and fix reported issues.
 
     **Available Tools:**
     - read_file(file_name) - read entire file contents
+    - read_files(file_names) - read several files at once (prefer over repeated
+      read_file calls)
     - read_file_chunk(file_name, start_line, end_line) - read lines (1-indexed)
     - list_files(directory) - list files in directory (default ".")
     - search_files(pattern) - find files by glob (e.g. "**/*.py")
@@ -62,6 +78,8 @@ SYSTEM_PROMPT_FIXPR = dedent("""\
 
     **Available Tools:**
     - read_file(file_name) - read entire file contents
+    - read_files(file_names) - read several files at once (prefer over repeated
+      read_file calls)
     - read_file_chunk(file_name, start_line, end_line) - read lines (1-indexed)
     - list_files(directory) - list files in directory (default ".")
     - search_files(pattern) - find files by glob (e.g. "**/*.py")
@@ -103,119 +121,136 @@ SYSTEM_PROMPT_FIXPR = dedent("""\
 """)
 
 
-def run_code_agent_fixissue(issue: Issue, repo_path: Path) -> str:
-    """Run code agent to fix issue and return PR description."""
-    logger.info(f"Starting agent to fix issue #{issue.number}: {issue.title}")
+# Dedented once here; filled with str.format so multi-line values stay intact
+USER_MESSAGE_FIXISSUE = dedent("""\
+    Fix the following issue:
 
-    model = create_chat_model()
-    tools = create_file_tools(repo_path)
+    **Issue title: {title}**
 
-    agent = create_agent(
-        model=model,
-        tools=tools,
-        system_prompt=SYSTEM_PROMPT_FIXISSUE,
-    )
+    **Issue body:**
 
-    tool_call_limit = os.getenv("TC_AGENT_TOOL_CALL_LIMIT")
-    if not tool_call_limit:
-        raise ValueError("TC_AGENT_TOOL_CALL_LIMIT environment variable is not set")
-    recursion_limit = int(tool_call_limit) * 2 + 10  # Each tool call = 2 steps
+    {body}
+""")
 
-    user_message = dedent(f"""\
-        Fix the following issue:
 
-        **Issue title: {issue.title}**
+USER_MESSAGE_FIXPR = dedent("""\
+    Fix the following pull request based on review feedback:
 
-        **Issue body:**
+    **PR #{pr_number}: {pr_title}**
 
-        {issue.body or "No description provided."}
-    """)
+    **Related Issue #{issue_number}: {issue_title}**
+    {issue_body}
 
-    logger.debug(f"Running agent with recursion_limit={recursion_limit}")
-    response = agent.invoke(
-        {"messages": [{"role": "user", "content": user_message}]},
-        {"recursion_limit": recursion_limit},
+    **Current Code Changes in PR:**
+    ```diff
+    {changes}
+    ```
+
+    **Latest Review Feedback:**
+    {review_body}
+
+    Please analyze the current changes, understand the feedback,
+    and apply necessary fixes.
+""")
+
+
+@functools.lru_cache(maxsize=2)
+def _get_agent(system_prompt: str) -> CompiledStateGraph[Any]:
+    """Build the agent graph once per system prompt and reuse it across runs."""
+    # File tools read their base directory from create_file_tools at call time
+    return create_agent(
+        model=create_chat_model(),
+        tools=FILE_TOOLS,
+        system_prompt=system_prompt,
     )
 
-    # Extract final message from response
-    messages = response.get("messages", [])
+
+def _run_agent(agent: CompiledStateGraph[Any], user_message: str) -> str:
+    """Stream agent steps to the log and return the final message content."""
+    messages: list[Any] = []
+    for state in agent.stream(
+        {"messages": [{"role": "user", "content": user_message}]},
+        {"recursion_limit": get_recursion_limit()},
+        stream_mode="values",
+    ):
+        messages = state.get("messages", [])
+        if messages:
+            logger.debug("Agent step %d: %s message", len(messages), messages[-1].type)
+
     if not messages:
         raise ValueError("Agent response contains no messages")
+    _log_token_usage(messages)
+    return str(messages[-1].content)
+
+
+def _log_token_usage(messages: list[Any]) -> None:
+    """Log prompt tokens and how many were served from the provider prefix cache."""
+    input_tokens = cached_tokens = 0
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            continue
+        input_tokens += usage.get("input_tokens", 0)
+        cached_tokens += usage.get("input_token_details", {}).get("cache_read", 0)
+    logger.info(
+        "Agent used %d input tokens, %d served from prompt cache",
+        input_tokens,
+        cached_tokens,
+    )
+
+
+def run_code_agent_fixissue(issue: Issue, repo_path: Path) -> str:
+    """Run code agent to fix issue and return PR description."""
+    logger.info("Starting agent to fix issue #%d: %s", issue.number, issue.title)
 
-    result = messages[-1].content
+    create_file_tools(repo_path)
+    agent = _get_agent(SYSTEM_PROMPT_FIXISSUE)
+
+    user_message = USER_MESSAGE_FIXISSUE.format(
+        title=issue.title,
+        body=issue.body or "No description provided.",
+    )
+
+    logger.debug("Running agent with recursion_limit=%d", get_recursion_limit())
+    result = _run_agent(agent, user_message)
     logger.info("Agent completed fixing issue")
 
-    return str(result)
+    return result
 
 
 def run_code_agent_fixpr(
-    issue: Issue, pull_request: PullRequest, repo_path: Path
+    issue: Issue,
+    pull_request: PullRequest,
+    latest_review: PullRequestReview,
+    repo_path: Path,
 ) -> str:
     """Run code agent to fix PR based on review feedback."""
-    logger.info(f"Starting agent to fix PR #{pull_request.number}")
-
-    # Get the latest review
-    reviews = list(pull_request.get_reviews())
-    if not reviews:
-        logger.warning("No reviews found for this PR")
-        latest_review_body = "No review comments available"
-    else:
-        latest_review = reviews[-1]
-        latest_review_body = latest_review.body or "No review body provided"
-        logger.debug(
-            f"Latest review by {latest_review.user.login}: {latest_review.state}"
-        )
+    logger.info("Starting agent to fix PR #%d", pull_request.number)
+
+    latest_review_body = latest_review.body or "No review body provided"
+    logger.debug(
+        "Latest review by %s: %s", latest_review.user.login, latest_review.state
+    )
 
     # Get code changes
     logger.debug("Fetching file changes from PR")
     changes = get_pr_changes(pull_request)
 
-    model = create_chat_model()
-    tools = create_file_tools(repo_path)
-
-    agent = create_agent(
-        model=model,
-        tools=tools,
-        system_prompt=SYSTEM_PROMPT_FIXPR,
+    create_file_tools(repo_path)
+    agent = _get_agent(SYSTEM_PROMPT_FIXPR)
+
+    user_message = USER_MESSAGE_FIXPR.format(
+        pr_number=pull_request.number,
+        pr_title=pull_request.title,
+        issue_number=issue.number,
+        issue_title=issue.title,
+        issue_body=issue.body or "No description provided.",
+        changes=format_pr_changes(changes, bounded=True),
+        review_body=latest_review_body,
     )
 
-    tool_call_limit = os.getenv("TC_AGENT_TOOL_CALL_LIMIT")
-    if not tool_call_limit:
-        raise ValueError("TC_AGENT_TOOL_CALL_LIMIT environment variable is not set")
-    recursion_limit = int(tool_call_limit) * 2 + 10
-
-    user_message = dedent(f"""\
-        Fix the following pull request based on review feedback:
-
-        **PR #{pull_request.number}: {pull_request.title}**
-
-        **Related Issue #{issue.number}: {issue.title}**
-        {issue.body or "No description provided."}
-
-        **Current Code Changes in PR:**
-        ```json
-        {json.dumps(changes, indent=2, ensure_ascii=False)}
-        ```
-
-        **Latest Review Feedback:**
-        {latest_review_body}
-
-        Please analyze the current changes, understand the feedback,
-        and apply necessary fixes.
-    """)
-
     logger.debug("Running fix PR agent")
-    response = agent.invoke(
-        {"messages": [{"role": "user", "content": user_message}]},
-        {"recursion_limit": recursion_limit},
-    )
-
-    # Extract final message from response
-    messages = response.get("messages", [])
-    if not messages:
-        raise ValueError("Agent response contains no messages")
-
-    result = messages[-1].content
+    result = _run_agent(agent, user_message)
     logger.info("Agent completed fixes")
 
-    return str(result)
+    return result
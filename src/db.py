@@ -1,7 +1,9 @@
 """SQLite database for tracking PR fix attempts (server mode only)."""
 
 import os
+import queue
 import sqlite3
+import threading
 from collections.abc import Generator
 from contextlib import contextmanager
 from pathlib import Path
@@ -16,29 +18,67 @@ if not _db_path:
     raise RuntimeError("Missing TC_DB_PATH in .env")
 DB_PATH = Path(_db_path)
 
+# Statements are module constants so pooled connections reuse their
+# prepared-statement cache instead of compiling fresh SQL text
+SQL_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS pr_fix_attempts (
+        pr_key TEXT PRIMARY KEY,
+        attempts INTEGER DEFAULT 0,
+        completed INTEGER DEFAULT 0
+    )
+"""
+SQL_GET_ATTEMPTS = "SELECT attempts FROM pr_fix_attempts WHERE pr_key = ?"
+SQL_INCREMENT_ATTEMPTS = """
+    INSERT INTO pr_fix_attempts (pr_key, attempts) VALUES (?, 1)
+    ON CONFLICT(pr_key) DO UPDATE SET attempts = attempts + 1
+    RETURNING attempts
+"""
+SQL_MARK_COMPLETED = """
+    INSERT INTO pr_fix_attempts (pr_key, completed) VALUES (?, 1)
+    ON CONFLICT(pr_key) DO UPDATE SET completed = 1
+"""
+SQL_IS_COMPLETED = "SELECT completed FROM pr_fix_attempts WHERE pr_key = ?"
+
+# Completion is never reverted, so completed PRs can be answered from memory
+_completed_prs: set[str] = set()
+_completed_lock = threading.Lock()
+
 
 def get_connection() -> sqlite3.Connection:
-    """Get database connection, creating tables if needed."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS pr_fix_attempts (
-            pr_key TEXT PRIMARY KEY,
-            attempts INTEGER DEFAULT 0,
-            completed INTEGER DEFAULT 0
-        )
-    """)
-    conn.commit()
+    """Open a database connection tuned for concurrent webhook workers."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 
+# Idle connections, reused so each query skips opening the db/wal/shm files
+_pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+
+
 @contextmanager
 def db_connection() -> Generator[sqlite3.Connection, Any, None]:
-    """Context manager for database connection."""
-    conn = get_connection()
+    """Context manager for a pooled database connection."""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = get_connection()
     try:
         yield conn
     finally:
-        conn.close()
+        conn.rollback()
+        _pool.put(conn)
+
+
+def init_db() -> None:
+    """Create tables if needed."""
+    with db_connection() as conn:
+        conn.execute(SQL_CREATE_TABLE)
+        conn.commit()
+
+
+init_db()
 
 
 def make_pr_key(owner: str, repo: str, pr_number: int) -> str:
@@ -50,9 +90,7 @@ def get_fix_attempts(owner: str, repo: str, pr_number: int) -> int:
     """Get current number of fix attempts for a PR."""
     pr_key = make_pr_key(owner, repo, pr_number)
     with db_connection() as conn:
-        cursor = conn.execute(
-            "SELECT attempts FROM pr_fix_attempts WHERE pr_key = ?", (pr_key,)
-        )
+        cursor = conn.execute(SQL_GET_ATTEMPTS, (pr_key,))
         row = cursor.fetchone()
         return row[0] if row else 0
 
@@ -61,42 +99,33 @@ def increment_fix_attempts(owner: str, repo: str, pr_number: int) -> int:
     """Increment fix attempts counter. Returns new count."""
     pr_key = make_pr_key(owner, repo, pr_number)
     with db_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO pr_fix_attempts (pr_key, attempts) VALUES (?, 1)
-            ON CONFLICT(pr_key) DO UPDATE SET attempts = attempts + 1
-            """,
-            (pr_key,),
-        )
+        cursor = conn.execute(SQL_INCREMENT_ATTEMPTS, (pr_key,))
+        (attempts,) = cursor.fetchone()
         conn.commit()
-        cursor = conn.execute(
-            "SELECT attempts FROM pr_fix_attempts WHERE pr_key = ?", (pr_key,)
-        )
-        result = cursor.fetchone()
-        assert result is not None
-        return int(result[0])
+        return int(attempts)
 
 
 def mark_pr_completed(owner: str, repo: str, pr_number: int) -> None:
     """Mark PR as completed (approved or max retries reached)."""
     pr_key = make_pr_key(owner, repo, pr_number)
     with db_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO pr_fix_attempts (pr_key, completed) VALUES (?, 1)
-            ON CONFLICT(pr_key) DO UPDATE SET completed = 1
-            """,
-            (pr_key,),
-        )
+        conn.execute(SQL_MARK_COMPLETED, (pr_key,))
         conn.commit()
+    with _completed_lock:
+        _completed_prs.add(pr_key)
 
 
 def is_pr_completed(owner: str, repo: str, pr_number: int) -> bool:
     """Check if PR processing is completed."""
     pr_key = make_pr_key(owner, repo, pr_number)
+    with _completed_lock:
+        if pr_key in _completed_prs:
+            return True
     with db_connection() as conn:
-        cursor = conn.execute(
-            "SELECT completed FROM pr_fix_attempts WHERE pr_key = ?", (pr_key,)
-        )
+        cursor = conn.execute(SQL_IS_COMPLETED, (pr_key,))
         row = cursor.fetchone()
-        return bool(row and row[0])
+    completed = bool(row and row[0])
+    if completed:
+        with _completed_lock:
+            _completed_prs.add(pr_key)
+    return completed
@@ -1,40 +1,219 @@
 """Custom file tools for LangChain agents."""
 
+import fnmatch
+import functools
+import itertools
 import json
 import logging
+import os
+import re
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from langchain_core.tools import tool
 
+from .agent_utils import format_json
+from .gh_cache import TTLCache
+
 logger = logging.getLogger("tishcode")
 
 # Global variable to store base directory (set by create_file_tools)
 _base_dir: Path | None = None
+# str(_base_dir) with a trailing separator, for slicing paths in _relative
+_base_prefix = ""
+# Paths modified by write tools, per checkout and relative to it; server jobs
+# configure file tools concurrently, so one job must not reset another's set
+_changed_files: dict[Path, set[str]] = {}
+# Relative paths of all files outside .git, per checkout; write tools drop it.
+# Keyed by base directory, so a walk finishing late can't answer another job
+_file_index: TTLCache[list[str]] = TTLCache(maxsize=8, ttl=60 * 60)
+# "**/*.ext" and "dir/**/*.ext" patterns are served by the index, not Path.glob
+RECURSIVE_SUFFIX_RE = re.compile(r"((?:[^/*?\[\]]+/)*)\*\*/\*(\.[^/*?\[\]]+)")
+# Other "**/name" patterns match the file name against the index with fnmatch
+RECURSIVE_NAME_RE = re.compile(r"((?:[^/*?\[\]]+/)*)\*\*/((?!\*\*)[^/]+)")
+# File reads and byte searches release the GIL, so grep scans files in parallel
+GREP_WORKERS = 8
+# grep_search skips files with a NUL byte in this many leading bytes
+BINARY_SNIFF_BYTES = 512
+_grep_executor = ThreadPoolExecutor(max_workers=GREP_WORKERS)
+# search_files returns at most this many paths unless asked for more
+MAX_SEARCH_RESULTS = 1000
+# Longer file contents are cut before they reach the model context
+MAX_TOOL_OUTPUT_CHARS = 64 * 1024
+# The agent may run several tool calls at once; writes are applied one at a time
+_write_lock = threading.Lock()
 
 
 def _check_path(relative_path: str) -> tuple[bool, Path]:
     """Check if the file path is within the base directory."""
     if _base_dir is None:
         return False, Path()
+    return _resolve_under(_base_dir, relative_path)
+
+
+@functools.lru_cache(maxsize=2048)
+def _resolve_under(base_dir: Path, relative_path: str) -> tuple[bool, Path]:
+    """Resolve relative_path against an already resolved base_dir."""
+    # The base is part of the key, so checkouts never share entries
+    base_prefix = os.path.join(base_dir, "")
     try:
-        base_resolved = _base_dir.resolve()
-        resolved = (_base_dir / relative_path).resolve()
+        resolved = (base_dir / relative_path).resolve()
         # Check that resolved path is inside base_dir (or equals to it)
-        if resolved == base_resolved or base_resolved in resolved.parents:
+        if resolved == base_dir or str(resolved).startswith(base_prefix):
             return True, resolved
-        return False, base_resolved
+        return False, base_dir
     except Exception:
-        return False, _base_dir
+        return False, base_dir
+
+
+def _relative(path: Path) -> str:
+    """Return path under _base_dir as a relative string by slicing off the base."""
+    return str(path)[len(_base_prefix) :]
+
+
+def _mark_changed(file_path: Path) -> None:
+    """Remember that file was modified so it can be staged later."""
+    assert _base_dir is not None
+    _changed_files.setdefault(_base_dir, set()).add(
+        str(file_path.relative_to(_base_dir))
+    )
+    _file_index.pop(_base_dir)
+    # mtime may not move between two quick writes, so don't trust it here
+    _load_lines.cache_clear()
+
+
+def _decode_text(raw: bytes) -> str:
+    """Decode UTF-8 bytes with the same newline handling as read_text."""
+    text = raw.decode("utf-8")
+    if b"\r" in raw:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _read_text(file_path: Path) -> str:
+    """Read a whole file as bytes and decode it once."""
+    return _decode_text(file_path.read_bytes())
+
+
+@functools.lru_cache(maxsize=32)
+def _load_lines(path: str, mtime_ns: int, size: int) -> tuple[str, list[int]]:
+    """Return file text and the offset where each of its lines starts."""
+    # mtime_ns and size are only part of the key, so edits miss the cache
+    text = _read_text(Path(path))
+    line_starts = [0]
+    pos = text.find("\n")
+    while pos >= 0:
+        line_starts.append(pos + 1)
+        pos = text.find("\n", pos + 1)
+    return text, line_starts
+
+
+def get_changed_files(base_dir: Path) -> list[str]:
+    """Return and forget paths modified under base_dir since create_file_tools."""
+    return sorted(_changed_files.pop(base_dir.resolve(), set()))
+
+
+def _serialized[**P, R](func: Callable[P, R]) -> Callable[P, R]:
+    """Run a write tool under the shared write lock."""
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        with _write_lock:
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _skip_lines(text: str, count: int, pos: int = 0) -> int:
+    """Return the offset just past count newlines, starting from pos."""
+    for _ in range(count):
+        pos = text.index("\n", pos) + 1
+    return pos
+
+
+def _splice_lines(contents: str, start: int, stop: int, new_content: str) -> str:
+    """Replace lines [start, stop) (0-indexed) with new_content by slicing."""
+    total_lines = contents.count("\n") + 1
+    stop = min(stop, total_lines)
+    if start < total_lines:
+        start_pos = _skip_lines(contents, start)
+        head = contents[:start_pos]
+    else:
+        start_pos = len(contents)
+        head = contents + "\n"
+    tail = None
+    if stop < total_lines:
+        tail = contents[_skip_lines(contents, stop - start, start_pos) :]
+
+    if not new_content:
+        if tail is None:
+            # Nothing follows, so the separator before the removed lines goes too
+            return head[:-1] if start > 0 else ""
+        return head + tail
+    if tail is None:
+        return head + new_content
+    return head + new_content + "\n" + tail
+
+
+def _walk_files(root: Path) -> Iterator[str]:
+    """Yield paths of files under root relative to _base_dir, skipping .git."""
+    assert _base_dir is not None
+    base_len = len(str(_base_dir)) + 1
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != ".git"]
+        rel_dir = dirpath[base_len:]
+        for name in filenames:
+            yield f"{rel_dir}/{name}" if rel_dir else name
+
+
+def _get_file_index() -> list[str]:
+    """Return all repository files, walking the tree only after a change."""
+    base_dir = _base_dir
+    assert base_dir is not None
+    index = _file_index.get(base_dir)
+    if index is None:
+        index = list(_walk_files(base_dir))
+        _file_index.set(base_dir, index)
+    return index
 
 
 def _log_result(tool_name: str, result: str) -> str:
     """Log tool result at debug level and return it."""
-    # Truncate long results for logging
-    log_result = result[:500] + "..." if len(result) > 500 else result
-    logger.debug(f"[{tool_name}] Result: {log_result}")
+    if logger.isEnabledFor(logging.DEBUG):
+        # Truncate long results for logging
+        log_result = result[:500] + "..." if len(result) > 500 else result
+        logger.debug("[%s] Result: %s", tool_name, log_result)
     return result
 
 
+def _truncate(result: str) -> str:
+    """Cut result to MAX_TOOL_OUTPUT_CHARS, noting how much was left out."""
+    if len(result) <= MAX_TOOL_OUTPUT_CHARS:
+        return result
+    remaining = len(result) - MAX_TOOL_OUTPUT_CHARS
+    return (
+        f"{result[:MAX_TOOL_OUTPUT_CHARS]}\n... (truncated, {remaining} more "
+        "characters; use read_file_chunk to read the rest)"
+    )
+
+
+def _read_file(file_name: str) -> str:
+    """Return file contents, or an error message the agent can act on."""
+    safe, file_path = _check_path(file_name)
+    if not safe:
+        logger.error("Attempted to read file outside base directory: %s", file_name)
+        return "Error: Cannot read file outside repository"
+    try:
+        return _truncate(_read_text(file_path))
+    except FileNotFoundError:
+        return f"Error: File not found: {file_name}"
+    except Exception as e:
+        logger.error("Error reading file: %s", e)
+        return f"Error reading file: {e}"
+
+
 @tool
 def read_file(file_name: str) -> str:
     """Read the entire contents of a file.
@@ -42,19 +221,20 @@ def read_file(file_name: str) -> str:
     Args:
         file_name: Path to the file relative to repository root (e.g. "src/main.py")
     """
-    logger.debug(f"[read_file] file_name={file_name}")
-    safe, file_path = _check_path(file_name)
-    if not safe:
-        logger.error(f"Attempted to read file outside base directory: {file_name}")
-        return _log_result("read_file", "Error: Cannot read file outside repository")
-    try:
-        result = file_path.read_text(encoding="utf-8")
-        return _log_result("read_file", result)
-    except FileNotFoundError:
-        return _log_result("read_file", f"Error: File not found: {file_name}")
-    except Exception as e:
-        logger.error(f"Error reading file: {e}")
-        return _log_result("read_file", f"Error reading file: {e}")
+    logger.debug("[read_file] file_name=%s", file_name)
+    return _log_result("read_file", _read_file(file_name))
+
+
+@tool
+def read_files(file_names: list[str]) -> str:
+    """Read several whole files in one call. Returns a JSON map of path to contents.
+
+    Args:
+        file_names: Paths to the files relative to repository root
+    """
+    logger.debug("[read_files] file_names=%s", file_names)
+    result = {file_name: _read_file(file_name) for file_name in file_names}
+    return _log_result("read_files", format_json(result))
 
 
 @tool
@@ -67,20 +247,18 @@ def read_file_chunk(file_name: str, start_line: int, end_line: int) -> str:
         end_line: Last line to read (1-indexed, inclusive)
     """
     logger.debug(
-        f"[read_file_chunk] file_name={file_name}, "
-        f"start_line={start_line}, end_line={end_line}"
+        "[read_file_chunk] file_name=%s, start_line=%d, end_line=%d",
+        file_name,
+        start_line,
+        end_line,
     )
     safe, file_path = _check_path(file_name)
     if not safe:
-        logger.error(f"Attempted to read file outside base directory: {file_name}")
+        logger.error("Attempted to read file outside base directory: %s", file_name)
         return _log_result(
             "read_file_chunk", "Error: Cannot read file outside repository"
         )
     try:
-        contents = file_path.read_text(encoding="utf-8")
-        lines = contents.split("\n")
-        total_lines = len(lines)
-
         # Validate line numbers (1-indexed)
         if start_line < 1 or end_line < 1:
             return _log_result("read_file_chunk", "Error: Line numbers must be >= 1")
@@ -88,24 +266,29 @@ def read_file_chunk(file_name: str, start_line: int, end_line: int) -> str:
             return _log_result(
                 "read_file_chunk", "Error: start_line must be <= end_line"
             )
+
+        stat = file_path.stat()
+        text, line_starts = _load_lines(str(file_path), stat.st_mtime_ns, stat.st_size)
+        total_lines = len(line_starts)
         if start_line > total_lines:
             return _log_result(
                 "read_file_chunk",
                 f"Error: start_line {start_line} exceeds file length ({total_lines})",
             )
 
-        # Convert to 0-indexed and slice
-        chunk_lines = lines[start_line - 1 : end_line]
-        result = "\n".join(chunk_lines)
-        return _log_result("read_file_chunk", result)
+        # Slice up to, but not including, the newline that ends end_line
+        stop = line_starts[end_line] - 1 if end_line < total_lines else len(text)
+        result = text[line_starts[start_line - 1] : stop]
+        return _log_result("read_file_chunk", _truncate(result))
     except FileNotFoundError:
         return _log_result("read_file_chunk", f"Error: File not found: {file_name}")
     except Exception as e:
-        logger.error(f"Error reading file chunk: {e}")
+        logger.error("Error reading file chunk: %s", e)
         return _log_result("read_file_chunk", f"Error reading file chunk: {e}")
 
 
 @tool
+@_serialized
 def save_file(file_name: str, contents: str) -> str:
     """Create or overwrite a file with the given contents.
 
@@ -113,22 +296,24 @@ def save_file(file_name: str, contents: str) -> str:
         file_name: Path to the file relative to repository root (e.g. "src/main.py")
         contents: The full contents to write to the file
     """
-    logger.debug(f"[save_file] file_name={file_name}, contents_len={len(contents)}")
+    logger.debug("[save_file] file_name=%s, contents_len=%d", file_name, len(contents))
     safe, file_path = _check_path(file_name)
     if not safe:
-        logger.error(f"Attempted to save file outside base directory: {file_name}")
+        logger.error("Attempted to save file outside base directory: %s", file_name)
         return _log_result("save_file", "Error: Cannot save file outside repository")
     try:
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_text(contents, encoding="utf-8")
-        logger.info(f"Saved file: {file_name}")
+        file_path.write_bytes(contents.encode("utf-8"))
+        _mark_changed(file_path)
+        logger.info("Saved file: %s", file_name)
         return _log_result("save_file", f"Successfully saved file: {file_name}")
     except Exception as e:
-        logger.error(f"Error saving file: {e}")
+        logger.error("Error saving file: %s", e)
         return _log_result("save_file", f"Error saving file: {e}")
 
 
 @tool
+@_serialized
 def insert_lines(file_name: str, after_line: int, content: str) -> str:
     """Insert new lines AFTER the specified line number (1-indexed).
 
@@ -140,52 +325,59 @@ def insert_lines(file_name: str, after_line: int, content: str) -> str:
         content: Content to insert (can be multiple lines)
     """
     logger.debug(
-        f"[insert_lines] file_name={file_name}, "
-        f"after_line={after_line}, content_len={len(content)}"
+        "[insert_lines] file_name=%s, after_line=%d, content_len=%d",
+        file_name,
+        after_line,
+        len(content),
     )
     safe, file_path = _check_path(file_name)
     if not safe:
-        logger.error(f"Attempted to modify file outside base directory: {file_name}")
+        logger.error("Attempted to modify file outside base directory: %s", file_name)
         return _log_result(
             "insert_lines", "Error: Cannot modify file outside repository"
         )
     try:
-        contents = file_path.read_text(encoding="utf-8")
-        lines = contents.split("\n")
-        total_lines = len(lines)
-
-        if after_line < 0:
-            return _log_result("insert_lines", "Error: after_line must be >= 0")
-        if after_line > total_lines:
-            return _log_result(
-                "insert_lines",
-                f"Error: after_line {after_line} exceeds file length ({total_lines})",
-            )
-
-        # Insert new lines after specified line
-        before = lines[:after_line]
-        after = lines[after_line:]
-        new_lines = content.split("\n") if content else []
-
-        result_lines = before + new_lines + after
-        new_contents = "\n".join(result_lines)
-
-        file_path.write_text(new_contents, encoding="utf-8")
+        # Read and rewrite through a single open file
+        with file_path.open("r+", encoding="utf-8") as f:
+            contents = f.read()
+            total_lines = contents.count("\n") + 1
+
+            if after_line < 0:
+                return _log_result("insert_lines", "Error: after_line must be >= 0")
+            if after_line > total_lines:
+                return _log_result(
+                    "insert_lines",
+                    f"Error: after_line {after_line} exceeds file length "
+                    f"({total_lines})",
+                )
+
+            # Insert new lines after specified line
+            new_contents = _splice_lines(contents, after_line, after_line, content)
+            new_line_count = content.count("\n") + 1 if content else 0
+
+            f.seek(0)
+            f.write(new_contents)
+            f.truncate()
+        _mark_changed(file_path)
         logger.info(
-            f"Inserted {len(new_lines)} lines after line {after_line} in {file_name}"
+            "Inserted %d lines after line %d in %s",
+            new_line_count,
+            after_line,
+            file_name,
         )
         return _log_result(
             "insert_lines",
-            f"Successfully inserted {len(new_lines)} lines after line {after_line}",
+            f"Successfully inserted {new_line_count} lines after line {after_line}",
         )
     except FileNotFoundError:
         return _log_result("insert_lines", f"Error: File not found: {file_name}")
     except Exception as e:
-        logger.error(f"Error inserting lines: {e}")
+        logger.error("Error inserting lines: %s", e)
         return _log_result("insert_lines", f"Error inserting lines: {e}")
 
 
 @tool
+@_serialized
 def replace_file_chunk(
     file_name: str, start_line: int, end_line: int, new_content: str
 ) -> str:
@@ -201,75 +393,83 @@ def replace_file_chunk(
         new_content: New content to insert in place of deleted lines
     """
     logger.debug(
-        f"[replace_file_chunk] file_name={file_name}, "
-        f"start_line={start_line}, end_line={end_line}, "
-        f"new_content_len={len(new_content)}"
+        "[replace_file_chunk] file_name=%s, start_line=%d, end_line=%d, "
+        "new_content_len=%d",
+        file_name,
+        start_line,
+        end_line,
+        len(new_content),
     )
     safe, file_path = _check_path(file_name)
     if not safe:
-        logger.error(f"Attempted to modify file outside base directory: {file_name}")
+        logger.error("Attempted to modify file outside base directory: %s", file_name)
         return _log_result(
             "replace_file_chunk", "Error: Cannot modify file outside repository"
         )
     try:
-        contents = file_path.read_text(encoding="utf-8")
-        lines = contents.split("\n")
-        total_lines = len(lines)
-
-        # Validate line numbers (1-indexed)
-        if start_line < 1 or end_line < 1:
-            return _log_result("replace_file_chunk", "Error: Line numbers must be >= 1")
-        if start_line > end_line:
-            return _log_result(
-                "replace_file_chunk", "Error: start_line must be <= end_line"
-            )
-        if start_line > total_lines:
-            return _log_result(
-                "replace_file_chunk",
-                f"Error: start_line {start_line} exceeds file length ({total_lines})",
+        # Read and rewrite through a single open file
+        with file_path.open("r+", encoding="utf-8") as f:
+            contents = f.read()
+            total_lines = contents.count("\n") + 1
+
+            # Validate line numbers (1-indexed)
+            if start_line < 1 or end_line < 1:
+                return _log_result(
+                    "replace_file_chunk", "Error: Line numbers must be >= 1"
+                )
+            if start_line > end_line:
+                return _log_result(
+                    "replace_file_chunk", "Error: start_line must be <= end_line"
+                )
+            if start_line > total_lines:
+                return _log_result(
+                    "replace_file_chunk",
+                    f"Error: start_line {start_line} exceeds file length "
+                    f"({total_lines})",
+                )
+
+            # Replace lines (convert to 0-indexed)
+            new_contents = _splice_lines(
+                contents, start_line - 1, end_line, new_content
             )
 
-        # Replace lines (convert to 0-indexed)
-        before = lines[: start_line - 1]
-        after = lines[end_line:]
-        new_lines = new_content.split("\n") if new_content else []
-
-        # Check for potential data loss
-        old_line_count = end_line - start_line + 1
-        new_line_count = len(new_lines)
-        lines_lost = old_line_count - new_line_count
+            # Check for potential data loss
+            old_line_count = end_line - start_line + 1
+            new_line_count = new_content.count("\n") + 1 if new_content else 0
+            lines_lost = old_line_count - new_line_count
 
-        result_lines = before + new_lines + after
-        new_contents = "\n".join(result_lines)
-
-        file_path.write_text(new_contents, encoding="utf-8")
-        logger.info(f"Replaced lines {start_line}-{end_line} in {file_name}")
+            f.seek(0)
+            f.write(new_contents)
+            f.truncate()
+        _mark_changed(file_path)
+        logger.info("Replaced lines %d-%d in %s", start_line, end_line, file_name)
 
         # Warn if significant content was lost
         msg = f"Replaced {old_line_count} lines with {new_line_count} lines"
         if lines_lost > 3:
             msg += f". WARNING: {lines_lost} lines removed - verify this is correct!"
-            logger.warning(f"Potential data loss: {lines_lost} lines removed")
+            logger.warning("Potential data loss: %d lines removed", lines_lost)
 
         return _log_result("replace_file_chunk", msg)
     except FileNotFoundError:
         return _log_result("replace_file_chunk", f"Error: File not found: {file_name}")
     except Exception as e:
-        logger.error(f"Error replacing file chunk: {e}")
+        logger.error("Error replacing file chunk: %s", e)
         return _log_result("replace_file_chunk", f"Error replacing file chunk: {e}")
 
 
 @tool
+@_serialized
 def delete_file(file_name: str) -> str:
     """Delete a file from the repository.
 
     Args:
         file_name: Path to the file relative to repository root (e.g. "src/old_file.py")
     """
-    logger.debug(f"[delete_file] file_name={file_name}")
+    logger.debug("[delete_file] file_name=%s", file_name)
     safe, file_path = _check_path(file_name)
     if not safe:
-        logger.error(f"Attempted to delete file outside base directory: {file_name}")
+        logger.error("Attempted to delete file outside base directory: %s", file_name)
         return _log_result(
             "delete_file", "Error: Cannot delete file outside repository"
         )
@@ -278,12 +478,13 @@ def delete_file(file_name: str) -> str:
             file_path.rmdir()
         else:
             file_path.unlink()
-        logger.info(f"Deleted file: {file_name}")
+        _mark_changed(file_path)
+        logger.info("Deleted file: %s", file_name)
         return _log_result("delete_file", f"Successfully deleted: {file_name}")
     except FileNotFoundError:
         return _log_result("delete_file", f"Error: File not found: {file_name}")
     except Exception as e:
-        logger.error(f"Error deleting file: {e}")
+        logger.error("Error deleting file: %s", e)
         return _log_result("delete_file", f"Error deleting file: {e}")
 
 
@@ -294,48 +495,151 @@ def list_files(directory: str = ".") -> str:
     Args:
         directory: Path to directory relative to repository root (e.g. "src" or ".")
     """
-    logger.debug(f"[list_files] directory={directory}")
+    logger.debug("[list_files] directory=%s", directory)
     safe, dir_path = _check_path(directory)
     if not safe:
-        logger.error(f"Attempted to list files outside base directory: {directory}")
+        logger.error("Attempted to list files outside base directory: %s", directory)
         return _log_result("list_files", "Error: Cannot list files outside repository")
     try:
         if not dir_path.is_dir():
             return _log_result("list_files", f"Error: Not a directory: {directory}")
-        files = [str(f.relative_to(_base_dir)) for f in dir_path.iterdir()]
+        # DirEntry names avoid a stat and a relative_to per entry
+        prefix = str(dir_path.relative_to(_base_dir))
+        with os.scandir(dir_path) as entries:
+            if prefix == ".":
+                files = [entry.name for entry in entries]
+            else:
+                files = [f"{prefix}/{entry.name}" for entry in entries]
         result = json.dumps(files, indent=2)
         return _log_result("list_files", result)
     except Exception as e:
-        logger.error(f"Error listing files: {e}")
+        logger.error("Error listing files: %s", e)
         return _log_result("list_files", f"Error listing files: {e}")
 
 
+def _is_index_prefix(prefix: str) -> bool:
+    """Check that prefix is empty or a normalized "dir/" as stored in the index."""
+    # normpath keeps a leading "./" or "../", so check the components instead
+    return all(part not in (".", "..") for part in prefix.split("/")[:-1])
+
+
+def _glob_files(pattern: str) -> Iterator[str]:
+    """Yield files matching pattern, handling common shapes without Path.glob."""
+    assert _base_dir is not None
+    if not any(c in pattern for c in "*?["):
+        # Literal path: a single stat instead of a glob walk
+        safe, file_path = _check_path(pattern)
+        if safe and file_path.is_file():
+            yield _relative(file_path)
+        return
+
+    # Index paths are normalized, so "./" or ".." prefixes go through glob
+    suffix_match = RECURSIVE_SUFFIX_RE.fullmatch(pattern)
+    if suffix_match and _is_index_prefix(prefix := suffix_match.group(1)):
+        suffix = suffix_match.group(2)
+        yield from (
+            p for p in _get_file_index() if p.startswith(prefix) and p.endswith(suffix)
+        )
+        return
+    name_match = RECURSIVE_NAME_RE.fullmatch(pattern)
+    if name_match and _is_index_prefix(prefix := name_match.group(1)):
+        match_name = re.compile(fnmatch.translate(name_match.group(2))).match
+        yield from (
+            p
+            for p in _get_file_index()
+            if p.startswith(prefix) and match_name(p.rpartition("/")[2])
+        )
+        return
+
+    for f in _base_dir.glob(pattern):
+        if f.is_file():
+            yield _relative(f)
+
+
 @tool
-def search_files(pattern: str) -> str:
+def search_files(pattern: str, max_results: int = MAX_SEARCH_RESULTS) -> str:
     """Search for files matching a glob pattern.
 
     Args:
         pattern: Glob pattern to match (e.g. "**/*.py", ".github/workflows/*.yml")
+        max_results: Maximum number of files to return (default 1000)
     """
-    logger.debug(f"[search_files] pattern={pattern}")
+    logger.debug("[search_files] pattern=%s, max_results=%d", pattern, max_results)
     if _base_dir is None:
         return _log_result("search_files", "Error: Base directory not set")
     try:
-        matching_files = list(_base_dir.glob(pattern))
-        file_paths = [
-            str(f.relative_to(_base_dir)) for f in matching_files if f.is_file()
-        ]
+        # One extra match tells whether the list was cut
+        file_paths = list(itertools.islice(_glob_files(pattern), max_results + 1))
+        truncated = len(file_paths) > max_results
+        del file_paths[max_results:]
         result = {
             "pattern": pattern,
             "matches_found": len(file_paths),
+            "truncated": truncated,
             "files": file_paths,
         }
-        return _log_result("search_files", json.dumps(result, indent=2))
+        # Only a summary is logged; the path list can be long
+        logger.debug(
+            "[search_files] Result: %d files (truncated=%s)",
+            len(file_paths),
+            truncated,
+        )
+        return json.dumps(result, indent=2)
     except Exception as e:
-        logger.error(f"Error searching files: {e}")
+        logger.error("Error searching files: %s", e)
         return _log_result("search_files", f"Error searching files: {e}")
 
 
+def _grep_file(file_path: Path, query: str, limit: int) -> list[dict[str, str | int]]:
+    """Return up to limit lines of file_path containing query."""
+    assert _base_dir is not None
+    matches: list[dict[str, str | int]] = []
+
+    # Skip binary files and hidden directories
+    try:
+        rel_path = _relative(file_path)
+        if "/.git/" in f"/{rel_path}" or rel_path.startswith(".git/"):
+            return matches
+
+        with file_path.open("rb") as f:
+            # A NUL byte near the start marks a binary file; don't read the rest
+            head = f.read(BINARY_SNIFF_BYTES)
+            if b"\x00" in head:
+                return matches
+            raw = head + f.read()
+        # Most files have no hit; check the raw bytes before decoding
+        if query.encode("utf-8") not in raw:
+            return matches
+        content = _decode_text(raw)
+    except (UnicodeDecodeError, OSError):
+        # Skip binary or unreadable files
+        return matches
+
+    # Jump from hit to hit, counting newlines only in between
+    line_num = 1
+    counted_to = 0
+    pos = content.find(query)
+    while pos >= 0 and len(matches) < limit:
+        line_start = content.rfind("\n", 0, pos) + 1
+        line_end = content.find("\n", pos)
+        if line_end < 0:
+            line_end = len(content)
+        line_num += content.count("\n", counted_to, line_start)
+        counted_to = line_start
+        line = content[line_start:line_end]
+        matches.append(
+            {
+                "file": rel_path,
+                "line": line_num,
+                "content": line.strip()[:200],  # Truncate long lines
+            }
+        )
+        if line_end == len(content):
+            break
+        pos = content.find(query, line_end + 1)
+    return matches
+
+
 @tool
 def grep_search(query: str, path: str = ".", file_pattern: str = "**/*") -> str:
     """Search for text in file contents (like grep). Returns matching lines.
@@ -346,7 +650,7 @@ def grep_search(query: str, path: str = ".", file_pattern: str = "**/*") -> str:
         file_pattern: Glob pattern for files to search (default "**/*" for all)
     """
     logger.debug(
-        f"[grep_search] query={query}, path={path}, file_pattern={file_pattern}"
+        "[grep_search] query=%s, path=%s, file_pattern=%s", query, path, file_pattern
     )
     if _base_dir is None:
         return _log_result("grep_search", "Error: Base directory not set")
@@ -360,64 +664,76 @@ def grep_search(query: str, path: str = ".", file_pattern: str = "**/*") -> str:
         max_matches = 100  # Limit to prevent huge outputs
 
         # Get files to search
-        if search_path.is_file():
+        if "\n" in query or "\r" in query:
+            # Lines never contain newlines, so such a query can't match any
+            files_to_search = []
+        elif search_path.is_file():
             files_to_search = [search_path]
+        elif file_pattern == "**/*":
+            # Default pattern: every file under search_path, taken from the index
+            rel_dir = str(search_path.relative_to(_base_dir))
+            prefix = "" if rel_dir == "." else f"{rel_dir}/"
+            files_to_search = [
+                _base_dir / p for p in _get_file_index() if p.startswith(prefix)
+            ]
         else:
             files_to_search = [f for f in search_path.glob(file_pattern) if f.is_file()]
 
-        for file_path in files_to_search:
-            if len(matches) >= max_matches:
-                break
-
-            # Skip binary files and hidden directories
-            try:
-                rel_path = str(file_path.relative_to(_base_dir))
-                if "/.git/" in f"/{rel_path}" or rel_path.startswith(".git/"):
-                    continue
-
-                content = file_path.read_text(encoding="utf-8")
-                lines = content.split("\n")
-
-                for line_num, line in enumerate(lines, start=1):
-                    if query in line:
-                        matches.append(
-                            {
-                                "file": rel_path,
-                                "line": line_num,
-                                "content": line.strip()[:200],  # Truncate long lines
-                            }
-                        )
-                        if len(matches) >= max_matches:
-                            break
-            except (UnicodeDecodeError, PermissionError):
-                # Skip binary or unreadable files
-                continue
-
+        # Files are scanned concurrently but merged in order, stopping at the cap
+        futures = [
+            _grep_executor.submit(_grep_file, file_path, query, max_matches)
+            for file_path in files_to_search
+        ]
+        try:
+            for future in futures:
+                matches.extend(future.result()[: max_matches - len(matches)])
+                if len(matches) >= max_matches:
+                    break
+        finally:
+            # Drop scans that haven't started once enough matches are in
+            for future in futures:
+                future.cancel()
+
+        truncated = len(matches) >= max_matches
         result = {
             "query": query,
             "matches_found": len(matches),
-            "truncated": len(matches) >= max_matches,
+            "truncated": truncated,
             "matches": matches,
         }
-        return _log_result("grep_search", json.dumps(result, indent=2))
+        # Only a summary is logged; the match list can be long
+        logger.debug(
+            "[grep_search] Result: %d matches (truncated=%s)",
+            len(matches),
+            truncated,
+        )
+        return json.dumps(result, indent=2)
     except Exception as e:
-        logger.error(f"Error in grep_search: {e}")
+        logger.error("Error in grep_search: %s", e)
         return _log_result("grep_search", f"Error searching: {e}")
 
 
+FILE_TOOLS = [
+    read_file,
+    read_files,
+    read_file_chunk,
+    save_file,
+    insert_lines,
+    replace_file_chunk,
+    delete_file,
+    list_files,
+    search_files,
+    grep_search,
+]
+
+
 def create_file_tools(base_dir: Path) -> list:
     """Create file tools configured for the given base directory."""
-    global _base_dir
+    global _base_dir, _base_prefix
     _base_dir = base_dir.resolve()
-    logger.debug(f"File tools configured with base directory: {_base_dir}")
-    return [
-        read_file,
-        read_file_chunk,
-        save_file,
-        insert_lines,
-        replace_file_chunk,
-        delete_file,
-        list_files,
-        search_files,
-        grep_search,
-    ]
+    _base_prefix = os.path.join(_base_dir, "")
+    _changed_files[_base_dir] = set()
+    _file_index.pop(_base_dir)
+    _load_lines.cache_clear()
+    logger.debug("File tools configured with base directory: %s", _base_dir)
+    return FILE_TOOLS
@@ -1,31 +1,76 @@
+import functools
 import logging
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
 
 import jwt
 import requests
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from github import Github
 from github.Issue import Issue
 from github.PullRequest import PullRequest
 from github.Repository import Repository
+from github.WorkflowJob import WorkflowJob
 from github.WorkflowRun import WorkflowRun
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .gh_cache import TTLCache
 
 GITHUB_API = "https://api.github.com"
+GITHUB_POOL_SIZE = 16
+GITHUB_PER_PAGE = 100
+LOG_DOWNLOAD_WORKERS = 8
+JOB_FETCH_WORKERS = 8
 logger = logging.getLogger("tishcode")
 
+# Shared keep-alive session for GitHub calls made outside PyGithub
+_session = requests.Session()
+_session.headers["Accept"] = "application/vnd.github+json"
+_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=GITHUB_POOL_SIZE,
+        pool_maxsize=2 * GITHUB_POOL_SIZE,
+        max_retries=Retry(
+            total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504)
+        ),
+    ),
+)
+
+ISSUE_URL_RE = re.compile(r"https://github\.com/([^/]+)/([^/]+)/issues/(\d+)")
+PR_URL_RE = re.compile(r"https://github\.com/([^/]+)/([^/]+)/pull/(\d+)")
+PR_TITLE_ISSUE_RE = re.compile(r"\[tishcode fix issue #(\d+)\]", re.IGNORECASE)
+
+_issue_cache: TTLCache[Issue] = TTLCache(maxsize=1024, ttl=60)
+_pr_cache: TTLCache[PullRequest] = TTLCache(maxsize=1024, ttl=60)
+# App JWTs live 10 minutes, installation tokens 1 hour; refresh a bit earlier
+_jwt_cache: TTLCache[str] = TTLCache(maxsize=16, ttl=8 * 60)
+_token_cache: TTLCache[str] = TTLCache(maxsize=1024, ttl=50 * 60)
+# Keyed by token, so a refreshed token gets a fresh client
+_repo_cache: TTLCache[Repository] = TTLCache(maxsize=1024, ttl=50 * 60)
+# Tokens are dropped this long before the expires_at GitHub reports
+TOKEN_EXPIRY_MARGIN = 60
+# Installation IDs only change when the app is reinstalled
+_installation_id_cache: TTLCache[int] = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+
 
 def parse_issue_url(issue_url: str) -> tuple[str, str, int]:
     """Extract owner, repo, and issue number from GitHub issue URL."""
-    match = re.match(r"https://github\.com/([^/]+)/([^/]+)/issues/(\d+)", issue_url)
+    match = ISSUE_URL_RE.match(issue_url)
     if not match:
         raise ValueError(f"Invalid issue URL: {issue_url}")
     return match.group(1), match.group(2), int(match.group(3))
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_pr_url(pr_url: str) -> tuple[str, str, int]:
     """Extract owner, repo, and PR number from GitHub pull request URL."""
-    match = re.match(r"https://github\.com/([^/]+)/([^/]+)/pull/(\d+)", pr_url)
+    match = PR_URL_RE.match(pr_url)
     if not match:
         raise ValueError(f"Invalid pull request URL: {pr_url}")
     return match.group(1), match.group(2), int(match.group(3))
@@ -33,7 +78,7 @@ def parse_pr_url(pr_url: str) -> tuple[str, str, int]:
 
 def extract_issue_number_from_pr_title(pr_title: str) -> int | None:
     """Extract issue number from PR title with format '[tishcode fix issue #123]'."""
-    match = re.search(r"\[tishcode fix issue #(\d+)\]", pr_title, re.IGNORECASE)
+    match = PR_TITLE_ISSUE_RE.search(pr_title)
     if match:
         return int(match.group(1))
     return None
@@ -41,118 +86,186 @@ def extract_issue_number_from_pr_title(pr_title: str) -> int | None:
 
 def are_all_workflows_completed(gh_repo: Repository, head_sha: str) -> bool:
     """Check if all workflow runs for the given SHA are completed."""
-    runs = list(gh_repo.get_workflow_runs(head_sha=head_sha))
-    if not runs:
-        logger.debug(f"No workflow runs found for SHA: {head_sha}")
-        return True
-
-    for run in runs:
+    # Iterate lazily so later pages are only fetched while every run is completed
+    count = 0
+    for run in gh_repo.get_workflow_runs(head_sha=head_sha):
         if run.status != "completed":
             logger.debug(f"Workflow '{run.name}' still running (status={run.status})")
             return False
+        count += 1
 
-    logger.debug(f"All {len(runs)} workflows completed for SHA: {head_sha}")
+    if not count:
+        logger.debug(f"No workflow runs found for SHA: {head_sha}")
+    else:
+        logger.debug(f"All {count} workflows completed for SHA: {head_sha}")
     return True
 
 
+def get_workflow_jobs(runs: list[WorkflowRun]) -> dict[int, list[WorkflowJob]]:
+    """Fetch jobs of every workflow run concurrently, keyed by run id."""
+    if not runs:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(JOB_FETCH_WORKERS, len(runs))) as executor:
+        jobs = executor.map(lambda run: list(run.jobs()), runs)
+        return {run.id: run_jobs for run, run_jobs in zip(runs, jobs)}
+
+
+def _fetch_job_log(job: WorkflowJob) -> str | None:
+    """Download logs of a workflow job, or None if they can't be fetched."""
+    logger.debug(f"Getting logs for failed job: {job.name} (id={job.id})")
+    try:
+        r = _session.get(job.logs_url(), timeout=30)
+        r.raise_for_status()
+        return r.content.decode("utf-8-sig")
+    except Exception as e:
+        logger.warning(f"Failed to get logs for job {job.name}: {e}")
+        return None
+
+
 def get_workflow_runs_and_logs(
     gh_repo: Repository, pull_request: PullRequest
-) -> tuple[list[WorkflowRun], dict[int, str | None]]:
-    """Get all workflow runs for PR and logs of failed jobs."""
+) -> tuple[list[WorkflowRun], dict[int, list[WorkflowJob]], dict[int, str | None]]:
+    """Get all workflow runs for PR, their jobs by run id and logs of failed jobs."""
     sha = pull_request.head.sha
     logger.debug(f"Getting workflow runs for SHA: {sha}")
 
     runs = list(gh_repo.get_workflow_runs(head_sha=sha))
     logger.debug(f"Found {len(runs)} workflow runs")
 
-    failed_job_logs = {}
+    # Jobs of every run are needed for the review summary, not only failed ones
+    jobs_by_run = get_workflow_jobs(runs)
 
+    failed_jobs: list[WorkflowJob] = []
     for run in runs:
         if run.conclusion in ("failure", "timed_out"):
             logger.debug(f"Processing failed run: {run.name} - {run.conclusion}")
-            jobs = run.jobs()
-
-            for job in jobs:
-                if job.conclusion in ("failure", "timed_out"):
-                    logger.debug(
-                        f"Getting logs for failed job: {job.name} (id={job.id})"
-                    )
-                    try:
-                        r = requests.get(job.logs_url(), timeout=30)
-                        r.raise_for_status()
-                        logs_text = r.content.decode("utf-8-sig")
-                        failed_job_logs[job.id] = logs_text
-                    except Exception as e:
-                        logger.warning(f"Failed to get logs for job {job.name}: {e}")
-                        failed_job_logs[job.id] = None
+            failed_jobs.extend(
+                job
+                for job in jobs_by_run[run.id]
+                if job.conclusion in ("failure", "timed_out")
+            )
+
+    # Each download is a redirect lookup plus a fetch; run them side by side
+    failed_job_logs: dict[int, str | None] = {}
+    if failed_jobs:
+        workers = min(LOG_DOWNLOAD_WORKERS, len(failed_jobs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            logs = executor.map(_fetch_job_log, failed_jobs)
+            failed_job_logs = {job.id: text for job, text in zip(failed_jobs, logs)}
 
     logger.debug(f"Found {len(failed_job_logs)} failed jobs with logs")
-    return runs, failed_job_logs
+    return runs, jobs_by_run, failed_job_logs
 
 
-def make_app_jwt(app_id: str, private_key_pem: str) -> str:
+def make_app_jwt(app_id: str, private_key: RSAPrivateKey) -> str:
     """Generate JWT token for GitHub App authentication."""
     now = int(time.time())
     payload = {"iat": now - 30, "exp": now + 9 * 60, "iss": app_id}
-    return jwt.encode(payload, private_key_pem, algorithm="RS256")
+    return jwt.encode(payload, private_key, algorithm="RS256")
+
+
+def get_app_jwt(app_id: str, private_key: RSAPrivateKey) -> str:
+    """Return cached app JWT, signing a new one when it is about to expire."""
+    app_jwt = _jwt_cache.get(app_id)
+    if app_jwt is None:
+        logger.debug(f"Creating JWT for app {app_id}")
+        app_jwt = make_app_jwt(app_id, private_key)
+        _jwt_cache.set(app_id, app_jwt)
+    return app_jwt
 
 
 def get_installation_id(owner: str, repo: str, app_jwt: str) -> int:
-    """Get installation ID for a repository."""
-    r = requests.get(
+    """Get installation ID for a repository, reusing known IDs."""
+    installation_id = _installation_id_cache.get((owner, repo))
+    if installation_id is not None:
+        return installation_id
+    r = _session.get(
         f"{GITHUB_API}/repos/{owner}/{repo}/installation",
-        headers={
-            "Authorization": f"Bearer {app_jwt}",
-            "Accept": "application/vnd.github+json",
-        },
+        headers={"Authorization": f"Bearer {app_jwt}"},
         timeout=30,
     )
     r.raise_for_status()
-    return int(r.json()["id"])
+    installation_id = int(r.json()["id"])
+    _installation_id_cache.set((owner, repo), installation_id)
+    return installation_id
 
 
-def create_installation_token(installation_id: int, app_jwt: str) -> str:
-    """Create installation token for repository access."""
-    r = requests.post(
+def create_installation_token(
+    installation_id: int, app_jwt: str
+) -> tuple[str, datetime]:
+    """Create installation token for repository access and return its expiry."""
+    r = _session.post(
         f"{GITHUB_API}/app/installations/{installation_id}/access_tokens",
-        headers={
-            "Authorization": f"Bearer {app_jwt}",
-            "Accept": "application/vnd.github+json",
-        },
+        headers={"Authorization": f"Bearer {app_jwt}"},
         timeout=30,
     )
     r.raise_for_status()
-    return str(r.json()["token"])
+    data = r.json()
+    return str(data["token"]), datetime.fromisoformat(data["expires_at"])
 
 
 def get_installation_token(
-    app_id: str, private_key_pem: str, owner: str, repo: str
+    app_id: str, private_key: RSAPrivateKey, owner: str, repo: str
 ) -> str:
-    """Get installation token for repository."""
-    logger.debug(f"Creating JWT for app {app_id}")
-    app_jwt = make_app_jwt(app_id, private_key_pem)
+    """Get installation token for repository, reusing it until near expiry."""
+    token = _token_cache.get((owner, repo))
+    if token is not None:
+        logger.debug(f"Using cached installation token for {owner}/{repo}")
+        return token
+
+    app_jwt = get_app_jwt(app_id, private_key)
 
     logger.debug(f"Getting installation ID for {owner}/{repo}")
     inst_id = get_installation_id(owner, repo, app_jwt)
     logger.debug(f"Installation ID: {inst_id}")
 
-    return create_installation_token(inst_id, app_jwt)
+    try:
+        token, expires_at = create_installation_token(inst_id, app_jwt)
+    except requests.HTTPError:
+        # The app may have been reinstalled under a new ID
+        _installation_id_cache.pop((owner, repo))
+        raise
+    ttl = (expires_at - datetime.now(UTC)).total_seconds() - TOKEN_EXPIRY_MARGIN
+    _token_cache.set((owner, repo), token, ttl=ttl)
+    return token
 
 
 def get_github_repo(installation_token: str, owner: str, repo: str) -> Repository:
-    """Get GitHub repository object."""
-    gh = Github(installation_token)
-    return gh.get_repo(f"{owner}/{repo}")
+    """Get GitHub repository object, reusing it while the token is unchanged."""
+    key = (installation_token, owner, repo)
+    gh_repo = _repo_cache.get(key)
+    if gh_repo is None:
+        gh = Github(
+            installation_token, per_page=GITHUB_PER_PAGE, pool_size=GITHUB_POOL_SIZE
+        )
+        gh_repo = gh.get_repo(f"{owner}/{repo}")
+        _repo_cache.set(key, gh_repo)
+    return gh_repo
 
 
 def get_issue(gh_repo: Repository, issue_number: int) -> Issue:
-    """Fetch issue object from GitHub repository."""
-    return gh_repo.get_issue(number=issue_number)
+    """Fetch issue object from GitHub repository, reusing recent lookups."""
+    key = (gh_repo.full_name, "issue", issue_number)
+    issue = _issue_cache.get(key)
+    if issue is None:
+        issue = gh_repo.get_issue(number=issue_number)
+        _issue_cache.set(key, issue)
+    return issue
 
 
 def get_pull_request(gh_repo: Repository, pr_number: int) -> PullRequest:
-    """Fetch pull request object from GitHub repository."""
-    return gh_repo.get_pull(number=pr_number)
+    """Fetch pull request object from GitHub repository, reusing recent lookups."""
+    key = (gh_repo.full_name, "pr", pr_number)
+    pull_request = _pr_cache.get(key)
+    if pull_request is None:
+        pull_request = gh_repo.get_pull(number=pr_number)
+        _pr_cache.set(key, pull_request)
+    return pull_request
+
+
+def invalidate_pull_request(gh_repo: Repository, pr_number: int) -> None:
+    """Drop cached pull request after it was modified."""
+    _pr_cache.pop((gh_repo.full_name, "pr", pr_number))
 
 
 def create_pr(
@@ -167,6 +280,17 @@ def create_pr(
     return pr.html_url
 
 
+@functools.lru_cache(maxsize=4)
+def load_private_key(private_key_path: str) -> RSAPrivateKey:
+    """Read and parse GitHub App private key once per process."""
+    with open(private_key_path, "rb") as f:
+        # jwt.encode would otherwise parse the PEM again for every signature
+        private_key = load_pem_private_key(f.read(), password=None)
+    if not isinstance(private_key, RSAPrivateKey):
+        raise ValueError(f"Not an RSA private key: {private_key_path}")
+    return private_key
+
+
 def setup_github_access(owner: str, repo: str) -> tuple[str, Repository]:
     """Setup GitHub access: get installation token and repository object."""
     app_id = os.getenv("TC_GITHUB_APP_ID")
@@ -177,11 +301,10 @@ def setup_github_access(owner: str, repo: str) -> tuple[str, Repository]:
             "TC_GITHUB_APP_ID and TC_GITHUB_PRIVATE_KEY_PATH must be set in .env"
         )
 
-    with open(private_key_path) as f:
-        private_key_pem = f.read()
+    private_key = load_private_key(private_key_path)
 
     logger.info("Getting installation token")
-    installation_token = get_installation_token(app_id, private_key_pem, owner, repo)
+    installation_token = get_installation_token(app_id, private_key, owner, repo)
     logger.debug("Installation token obtained")
 
     logger.info("Getting GitHub repository")
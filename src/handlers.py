@@ -1,15 +1,26 @@
 """Business logic handlers for tishcode commands."""
 
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from github.Issue import Issue
+from github.Repository import Repository
 
 from src.code_agent import run_code_agent_fixissue, run_code_agent_fixpr
-from src.git_utils import clone_temp_repo, get_unique_branch_name
+from src.file_tools import get_changed_files
+from src.git_utils import (
+    clone_temp_repo,
+    commit_changes,
+    get_unique_branch_name,
+    stage_changes,
+)
 from src.github_utils import (
     create_pr,
     extract_issue_number_from_pr_title,
     get_issue,
     get_pull_request,
     get_workflow_runs_and_logs,
+    invalidate_pull_request,
     parse_issue_url,
     parse_pr_url,
     setup_github_access,
@@ -18,41 +29,54 @@ from src.review_agent import run_review_agent
 
 logger = logging.getLogger("tishcode")
 
+# One slot per server worker, so every running job can prefetch its issue
+PREFETCH_WORKERS = 4
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch"
+)
+
 
 def add_agent_signature(text: str, action: str = "by") -> str:
     """Add agent signature footer to text."""
     return f"{text}\n\n---\n*🤖 Automated {action} tishcode agent*"
 
 
+def prefetch_issue(gh_repo: Repository, issue_number: int) -> Future[Issue]:
+    """Start fetching issue in background to overlap it with other I/O."""
+    return _prefetch_executor.submit(get_issue, gh_repo, issue_number)
+
+
 def handle_fixissue(issue_url: str) -> str:
     """Handle fixissue command. Returns created PR URL."""
     owner, repo, issue_number = parse_issue_url(issue_url)
-    logger.info(f"Processing issue #{issue_number} in {owner}/{repo}")
+    logger.info("Processing issue #%d in %s/%s", issue_number, owner, repo)
 
     installation_token, gh_repo = setup_github_access(owner, repo)
 
     logger.info("Fetching issue details")
-    issue = get_issue(gh_repo, issue_number)
-    logger.debug(f"Issue title: {issue.title}")
+    issue_future = prefetch_issue(gh_repo, issue_number)
 
     with clone_temp_repo(owner, repo, installation_token) as (local_repo, repo_path):
+        issue = issue_future.result()
+        logger.debug("Issue title: %s", issue.title)
+
         base_branch_name = f"tishcode/issue-{issue_number}"
         branch_name = get_unique_branch_name(local_repo, base_branch_name)
         if branch_name != base_branch_name:
             logger.info(
-                f"Branch {base_branch_name} already exists, using {branch_name}"
+                "Branch %s already exists, using %s", base_branch_name, branch_name
             )
-        logger.info(f"Creating branch {branch_name}")
+        logger.info("Creating branch %s", branch_name)
         local_repo.git.checkout("-b", branch_name)
 
         logger.info("Running code agent")
         pr_description = run_code_agent_fixissue(issue, repo_path)
 
         logger.info("Committing changes")
-        local_repo.git.add(A=True)
-        local_repo.index.commit(f"Agent: implement issue #{issue_number}")
+        stage_changes(local_repo, get_changed_files(repo_path))
+        commit_changes(local_repo, f"Agent: implement issue #{issue_number}")
 
-        logger.info(f"Pushing to remote branch {branch_name}")
+        logger.info("Pushing to remote branch %s", branch_name)
         local_repo.git.push("origin", branch_name)
 
         logger.info("Creating pull request")
@@ -67,38 +91,42 @@ def handle_fixissue(issue_url: str) -> str:
             body=pr_body,
         )
 
-        logger.info(f"Pull request created: {pr_url}")
+        logger.info("Pull request created: %s", pr_url)
         return pr_url
 
 
 def handle_review(pr_url: str) -> bool:
     """Handle review command. Returns True if approved, False otherwise."""
     owner, repo, pr_number = parse_pr_url(pr_url)
-    logger.info(f"Reviewing PR #{pr_number} in {owner}/{repo}")
+    logger.info("Reviewing PR #%d in %s/%s", pr_number, owner, repo)
 
     _, gh_repo = setup_github_access(owner, repo)
 
     logger.info("Fetching pull request details")
     pull_request = get_pull_request(gh_repo, pr_number)
-    logger.debug(f"PR title: {pull_request.title}")
+    logger.debug("PR title: %s", pull_request.title)
 
     issue_number = extract_issue_number_from_pr_title(pull_request.title)
     if not issue_number:
         raise ValueError(
             f"Could not extract issue number from PR title: {pull_request.title}"
         )
-    logger.debug(f"Extracted issue number: {issue_number}")
+    logger.debug("Extracted issue number: %d", issue_number)
 
-    logger.info(f"Fetching related issue #{issue_number}")
-    issue = get_issue(gh_repo, issue_number)
-    logger.debug(f"Issue title: {issue.title}")
+    logger.info("Fetching related issue #%d", issue_number)
+    issue_future = prefetch_issue(gh_repo, issue_number)
 
     logger.info("Getting workflow run results")
-    workflow_runs, failed_job_logs = get_workflow_runs_and_logs(gh_repo, pull_request)
+    workflow_runs, jobs_by_run, failed_job_logs = get_workflow_runs_and_logs(
+        gh_repo, pull_request
+    )
+
+    issue = issue_future.result()
+    logger.debug("Issue title: %s", issue.title)
 
     logger.info("Running review agent")
     review_comment, approve = run_review_agent(
-        pull_request, issue, workflow_runs, failed_job_logs
+        pull_request, issue, workflow_runs, jobs_by_run, failed_job_logs
     )
 
     # Add approval status header
@@ -109,78 +137,90 @@ def handle_review(pr_url: str) -> bool:
         else "CHANGES REQUESTED - Issues need to be fixed"
     )
 
-    formatted_comment = f"## {status_icon} Code Review Result: {status_text}\n\n"
+    parts = [f"## {status_icon} Code Review Result: {status_text}\n\n"]
 
     # Add failed workflows summary if any
     failed_runs = [
         run for run in workflow_runs if run.conclusion in ("failure", "timed_out")
     ]
     if failed_runs:
-        formatted_comment += "### ⚠️ Failed Workflows\n\n"
+        parts.append("### ⚠️ Failed Workflows\n\n")
         for run in failed_runs:
-            formatted_comment += f"**{run.name}** ({run.conclusion})\n"
-            jobs = list(run.jobs())
+            parts.append(f"**{run.name}** ({run.conclusion})\n")
             failed_jobs = [
-                job for job in jobs if job.conclusion in ("failure", "timed_out")
+                job
+                for job in jobs_by_run[run.id]
+                if job.conclusion in ("failure", "timed_out")
             ]
             if failed_jobs:
-                formatted_comment += (
+                parts.append(
                     "  - Failed jobs: "
-                    + ", ".join([f"`{job.name}`" for job in failed_jobs])
+                    + ", ".join(f"`{job.name}`" for job in failed_jobs)
                     + "\n"
                 )
-        formatted_comment += "\n---\n\n"
+        parts.append("\n---\n\n")
 
     # Add agent's review comment
-    formatted_comment += review_comment
+    parts.append(review_comment)
+    formatted_comment = "".join(parts)
 
     # Add footer signature
     formatted_comment = add_agent_signature(formatted_comment, "review by")
 
     logger.info("Posting review comment")
     pull_request.create_review(body=formatted_comment, event="COMMENT")
+    invalidate_pull_request(gh_repo, pr_number)
 
-    logger.info(f"Review posted successfully (approve={approve})")
+    logger.info("Review posted successfully (approve=%s)", approve)
     return approve
 
 
 def handle_fixpr(pr_url: str) -> None:
     """Handle fixpr command."""
     owner, repo, pr_number = parse_pr_url(pr_url)
-    logger.info(f"Fixing PR #{pr_number} in {owner}/{repo}")
+    logger.info("Fixing PR #%d in %s/%s", pr_number, owner, repo)
 
     installation_token, gh_repo = setup_github_access(owner, repo)
 
     logger.info("Fetching pull request details")
     pull_request = get_pull_request(gh_repo, pr_number)
-    logger.debug(f"PR title: {pull_request.title}")
+    logger.debug("PR title: %s", pull_request.title)
 
     issue_number = extract_issue_number_from_pr_title(pull_request.title)
     if not issue_number:
         raise ValueError(
             f"Could not extract issue number from PR title: {pull_request.title}"
         )
-    logger.debug(f"Extracted issue number: {issue_number}")
-
-    logger.info(f"Fetching related issue #{issue_number}")
-    issue = get_issue(gh_repo, issue_number)
-    logger.debug(f"Issue title: {issue.title}")
-
-    with clone_temp_repo(owner, repo, installation_token) as (local_repo, repo_path):
-        branch_name = pull_request.head.ref
-        logger.info(f"Checking out PR branch {branch_name}")
-        local_repo.git.fetch("origin", branch_name)
-        local_repo.git.checkout(branch_name)
+    logger.debug("Extracted issue number: %d", issue_number)
+
+    # Reversed pages start from the last one, so only that page is fetched
+    latest_review = next(iter(pull_request.get_reviews().reversed), None)
+    if latest_review is None:
+        logger.info("No reviews on PR #%d, nothing to fix", pr_number)
+        return
+
+    logger.info("Fetching related issue #%d", issue_number)
+    issue_future = prefetch_issue(gh_repo, issue_number)
+
+    branch_name = pull_request.head.ref
+    logger.info("Cloning PR branch %s", branch_name)
+    with clone_temp_repo(owner, repo, installation_token, branch=branch_name) as (
+        local_repo,
+        repo_path,
+    ):
+        issue = issue_future.result()
+        logger.debug("Issue title: %s", issue.title)
 
         logger.info("Running code agent to fix PR")
-        comment = run_code_agent_fixpr(issue, pull_request, repo_path)
+        comment = run_code_agent_fixpr(issue, pull_request, latest_review, repo_path)
 
         logger.info("Committing changes")
-        local_repo.git.add(A=True)
-        local_repo.index.commit(f"Agent: apply fixes for PR #{pr_number}")
+        stage_changes(local_repo, get_changed_files(repo_path))
+        commit_changes(local_repo, f"Agent: apply fixes for PR #{pr_number}")
 
-        logger.info(f"Pushing to remote branch {branch_name}")
+        logger.info("Pushing to remote branch %s", branch_name)
         local_repo.git.push("origin", branch_name)
+        invalidate_pull_request(gh_repo, pr_number)
 
         logger.info("Posting comment to PR")
         comment = add_agent_signature(comment)
@@ -1,17 +1,36 @@
-import json
+import functools
 import logging
 import re
 from textwrap import dedent
+from typing import Any
 
 from github.Issue import Issue
 from github.PullRequest import PullRequest
+from github.WorkflowJob import WorkflowJob
 from github.WorkflowRun import WorkflowRun
+from langchain_core.runnables import Runnable
 from pydantic import BaseModel, Field
 
-from .agent_utils import create_chat_model, get_pr_changes
+from .agent_utils import (
+    create_chat_model,
+    format_json,
+    format_pr_changes,
+    get_pr_changes,
+    summarize_pr_changes,
+)
 
 logger = logging.getLogger("tishcode")
 
+LOG_TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z\s*")
+# Case-insensitive, so no lowercased copy of every log line is needed
+LOG_ERROR_RE = re.compile(r"##\[error\]|error:", re.IGNORECASE)
+# Total characters of failed job logs included in one review prompt
+MAX_LOG_CHARS = 200_000
+NO_CHANGES_COMMENT = (
+    "The pull request contains no file changes, so it cannot resolve the issue. "
+    "Make the code changes the issue asks for."
+)
+
 
 class ReviewResult(BaseModel):
     """Structured output for PR review."""
@@ -27,7 +46,7 @@ class ReviewResult(BaseModel):
 def preprocess_log_line(line: str, max_length: int = 1000) -> str:
     """Remove timestamp prefix and truncate long lines."""
     # Remove GitHub Actions timestamp (format: YYYY-MM-DDTHH:MM:SS.fffffffZ)
-    line = re.sub(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z\s*", "", line)
+    line = LOG_TIMESTAMP_RE.sub("", line, count=1)
 
     # Truncate if too long
     if len(line) > max_length:
@@ -36,34 +55,48 @@ def preprocess_log_line(line: str, max_length: int = 1000) -> str:
     return line
 
 
+def _start_of_line_above(text: str, pos: int, count: int) -> int:
+    """Return offset of the line count lines above the one containing pos."""
+    start = text.rfind("\n", 0, pos) + 1
+    for _ in range(count):
+        if start == 0:
+            break
+        start = text.rfind("\n", 0, start - 1) + 1
+    return start
+
+
+def _end_of_line_below(text: str, start: int, count: int) -> int:
+    """Return offset where the count lines beginning at start end."""
+    for _ in range(count):
+        newline = text.find("\n", start)
+        if newline < 0:
+            return len(text)
+        start = newline + 1
+    return start - 1
+
+
 def extract_relevant_log_lines(log_text: str, context_lines: int = 50) -> str:
     """Extract relevant lines around error markers from logs."""
     if not log_text:
         return ""
 
-    lines = log_text.split("\n")
-    error_indices = []
-
-    # Find all lines with error markers
-    for i, line in enumerate(lines):
-        if "##[error]" in line.lower() or "error:" in line.lower():
-            error_indices.append(i)
-
-    if not error_indices:
+    # Logs can be tens of MB; seek by offsets and split only the window
+    first_error = LOG_ERROR_RE.search(log_text)
+    if first_error is None:
         # No errors found, return last N lines
-        start_idx = max(0, len(lines) - context_lines)
-        relevant_lines = lines[start_idx:]
+        if context_lines <= 0:
+            return ""
+        start = _start_of_line_above(log_text, len(log_text), context_lines - 1)
+        end = len(log_text)
     else:
         # Get context around first error
-        first_error_idx = error_indices[0]
-        start_idx = max(0, first_error_idx - context_lines)
-        end_idx = min(len(lines), first_error_idx + 20)
-        relevant_lines = lines[start_idx:end_idx]
+        start = _start_of_line_above(log_text, first_error.start(), context_lines)
+        error_line = log_text.rfind("\n", 0, first_error.start()) + 1
+        end = _end_of_line_below(log_text, error_line, 20)
 
     # Preprocess each line
-    processed_lines = [preprocess_log_line(line) for line in relevant_lines]
-
-    return "\n".join(processed_lines)
+    relevant_lines = log_text[start:end].split("\n")
+    return "\n".join(preprocess_log_line(line) for line in relevant_lines)
 
 
 SYSTEM_PROMPT_REVIEW = dedent("""\
@@ -97,48 +130,79 @@ SYSTEM_PROMPT_REVIEW = dedent("""\
 """)
 
 
+# Dedented once here; filled with str.format so multi-line values stay intact
+USER_MESSAGE_REVIEW = dedent("""\
+    Review the following pull request:
+
+    **PR Title: {pr_title}**
+
+    **Related Issue Title: {issue_title}**
+    {issue_body}
+
+    **Code Changes ({changes_summary}):**
+    ```diff
+    {changes}
+    ```
+
+    **All Workflow Runs:**
+    ```json
+    {workflows}
+    ```
+
+    **Failed Workflows with Logs:**
+    {failed_workflows}
+
+    Analyze the changes and CI results, then provide your review.
+""")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_structured_model() -> Runnable[Any, Any]:
+    """Wrap the chat model for ReviewResult output once and reuse it."""
+    return create_chat_model().with_structured_output(ReviewResult)
+
+
 def run_review_agent(
     pull_request: PullRequest,
     issue: Issue,
     workflow_runs: list[WorkflowRun],
+    jobs_by_run: dict[int, list[WorkflowJob]],
     failed_job_logs: dict[int, str | None],
 ) -> tuple[str, bool]:
     """Run review agent to analyze pull request and provide feedback."""
-    logger.info(f"Starting review agent for PR #{pull_request.number}")
+    logger.info("Starting review agent for PR #%d", pull_request.number)
 
     # Get code changes
     logger.debug("Fetching file changes from PR")
     changes = get_pr_changes(pull_request)
+    if not changes:
+        # Nothing for the model to judge; an empty PR can't fix the issue
+        logger.info("PR #%d has no file changes, skipping model", pull_request.number)
+        return NO_CHANGES_COMMENT, False
 
     # Prepare workflow runs summary
     logger.debug("Preparing workflow runs summary")
-    workflows_summary = []
-    for run in workflow_runs:
-        jobs_info = []
-        for job in run.jobs():
-            jobs_info.append(
-                {
-                    "name": job.name,
-                    "conclusion": job.conclusion,
-                    "id": job.id,
-                }
-            )
-
-        workflows_summary.append(
-            {
-                "name": run.name,
-                "conclusion": run.conclusion,
-                "jobs": jobs_info,
-            }
-        )
+    workflows_summary = [
+        {
+            "name": run.name,
+            "conclusion": run.conclusion,
+            "jobs": [
+                {"name": job.name, "conclusion": job.conclusion, "id": job.id}
+                for job in jobs_by_run[run.id]
+            ],
+        }
+        for run in workflow_runs
+    ]
 
     # Prepare failed workflows with logs
+    # Logs go in as plain text: JSON escaping would inflate them in the prompt
     logger.debug("Preparing failed workflows data")
     failed_workflows = []
+    log_budget = MAX_LOG_CHARS
     for run in workflow_runs:
         if run.conclusion in ("failure", "timed_out"):
             failed_jobs_data = []
-            for job in run.jobs():
+            for job in jobs_by_run[run.id]:
                 if job.conclusion in ("failure", "timed_out"):
                     log_text = failed_job_logs.get(job.id)
                     processed_log = (
@@ -146,54 +210,33 @@ def run_review_agent(
                         if log_text
                         else "No logs available"
                     )
+                    if log_budget <= 0:
+                        processed_log = "[log truncated: budget exhausted]"
+                    elif len(processed_log) > log_budget:
+                        processed_log = processed_log[:log_budget] + "... [truncated]"
+                    log_budget -= len(processed_log)
 
                     failed_jobs_data.append(
-                        {
-                            "name": job.name,
-                            "conclusion": job.conclusion,
-                            "log": processed_log,
-                        }
+                        f"#### Job: {job.name} ({job.conclusion})\n"
+                        f"```\n{processed_log}\n```"
                     )
 
             if failed_jobs_data:
                 failed_workflows.append(
-                    {
-                        "name": run.name,
-                        "conclusion": run.conclusion,
-                        "failed_jobs": failed_jobs_data,
-                    }
+                    f"### Workflow: {run.name} ({run.conclusion})\n"
+                    + "\n".join(failed_jobs_data)
                 )
 
-    # Create model with structured output
-    model = create_chat_model()
-    structured_model = model.with_structured_output(ReviewResult)
-
     # Prepare user message
-    user_message = dedent(f"""\
-        Review the following pull request:
-
-        **PR Title: {pull_request.title}**
-
-        **Related Issue Title: {issue.title}**
-        {issue.body or "No description provided."}
-
-        **Code Changes:**
-        ```json
-        {json.dumps(changes, indent=2, ensure_ascii=False)}
-        ```
-
-        **All Workflow Runs:**
-        ```json
-        {json.dumps(workflows_summary, indent=2, ensure_ascii=False)}
-        ```
-
-        **Failed Workflows with Logs:**
-        ```json
-        {json.dumps(failed_workflows, indent=2, ensure_ascii=False)}
-        ```
-
-        Analyze the changes and CI results, then provide your review.
-    """)
+    user_message = USER_MESSAGE_REVIEW.format(
+        pr_title=pull_request.title,
+        issue_title=issue.title,
+        issue_body=issue.body or "No description provided.",
+        changes_summary=summarize_pr_changes(changes),
+        changes=format_pr_changes(changes),
+        workflows=format_json(workflows_summary),
+        failed_workflows="\n\n".join(failed_workflows) or "None",
+    )
 
     logger.debug("Running review agent")
     messages = [
@@ -201,7 +244,7 @@ def run_review_agent(
         {"role": "user", "content": user_message},
     ]
 
-    result = structured_model.invoke(messages)
-    logger.info(f"Review completed. Approve: {result.approve}")
+    result = _get_structured_model().invoke(messages)
+    logger.info("Review completed. Approve: %s", result.approve)
 
     return result.review_comment, result.approve
@@ -0,0 +1,38 @@
+import unittest
+
+from src.agent_utils import MAX_PATCH_CHARS, MAX_PATCH_FILES, format_pr_changes
+
+
+def make_change(name: str, patch: str) -> dict[str, str | int]:
+    return {
+        "filename": name,
+        "status": "modified",
+        "additions": 1,
+        "deletions": 0,
+        "patch": patch,
+    }
+
+
+class FormatPrChangesTest(unittest.TestCase):
+    def test_full_patches_by_default(self) -> None:
+        patch = "+" * (MAX_PATCH_CHARS + 100)
+        changes = [make_change(f"f{i}.py", patch) for i in range(MAX_PATCH_FILES + 1)]
+        rendered = format_pr_changes(changes)
+        self.assertEqual(rendered.count(patch), MAX_PATCH_FILES + 1)
+        self.assertNotIn("truncated", rendered)
+        self.assertNotIn("omitted", rendered)
+
+    def test_bounded_cuts_long_patches_and_extra_files(self) -> None:
+        patch = "+" * (MAX_PATCH_CHARS + 100)
+        changes = [make_change(f"f{i}.py", patch) for i in range(MAX_PATCH_FILES + 1)]
+        rendered = format_pr_changes(changes, bounded=True)
+        self.assertNotIn(patch, rendered)
+        self.assertEqual(
+            rendered.count("(truncated, 100 more characters)"), MAX_PATCH_FILES
+        )
+        self.assertEqual(rendered.count("Patch omitted: too many files in PR"), 1)
+        self.assertIn(f"=== f{MAX_PATCH_FILES}.py", rendered)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src import file_tools
+from src.file_tools import (
+    create_file_tools,
+    get_changed_files,
+    save_file,
+    search_files,
+)
+
+
+class FileToolsTestCase(unittest.TestCase):
+    def make_checkout(self) -> Path:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return Path(tmp.name)
+
+
+class ChangedFilesTest(FileToolsTestCase):
+    def test_changes_are_kept_per_checkout(self) -> None:
+        first = self.make_checkout()
+        second = self.make_checkout()
+
+        create_file_tools(first)
+        save_file.invoke({"file_name": "a.py", "contents": "a\n"})
+        # Another job configuring its own checkout must not reset the first
+        create_file_tools(second)
+        save_file.invoke({"file_name": "b.py", "contents": "b\n"})
+
+        self.assertEqual(get_changed_files(first), ["a.py"])
+        self.assertEqual(get_changed_files(second), ["b.py"])
+
+    def test_changes_are_reported_once(self) -> None:
+        checkout = self.make_checkout()
+        create_file_tools(checkout)
+        save_file.invoke({"file_name": "a.py", "contents": "a\n"})
+
+        self.assertEqual(get_changed_files(checkout), ["a.py"])
+        self.assertEqual(get_changed_files(checkout), [])
+
+
+class SearchFilesTest(FileToolsTestCase):
+    def setUp(self) -> None:
+        self.checkout = self.make_checkout()
+        for name in ("main.py", "src/app.py", "tests/test_app.py", "README.md"):
+            path = self.checkout / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("")
+        create_file_tools(self.checkout)
+
+    def search(self, pattern: str) -> list[str]:
+        result = json.loads(search_files.invoke({"pattern": pattern}))
+        return sorted(result["files"])
+
+    def test_recursive_suffix(self) -> None:
+        expected = ["main.py", "src/app.py", "tests/test_app.py"]
+        self.assertEqual(self.search("**/*.py"), expected)
+        self.assertEqual(self.search("src/**/*.py"), ["src/app.py"])
+
+    def test_dot_prefixed_recursive_suffix(self) -> None:
+        self.assertEqual(self.search("./**/*.py"), self.search("**/*.py"))
+
+    def test_recursive_name(self) -> None:
+        self.assertEqual(self.search("**/test_*.py"), ["tests/test_app.py"])
+
+    def test_dot_prefixed_recursive_name(self) -> None:
+        self.assertEqual(self.search("./**/test_*.py"), ["tests/test_app.py"])
+
+
+class CheckoutIsolationTest(FileToolsTestCase):
+    def setUp(self) -> None:
+        self.first = self.make_checkout().resolve()
+        self.second = self.make_checkout().resolve()
+        (self.first / "a.py").write_text("")
+        (self.second / "b.py").write_text("")
+
+    def test_path_lookup_of_other_checkout_is_not_reused(self) -> None:
+        create_file_tools(self.second)
+        # A lookup still running for the first checkout stores its entry late
+        file_tools._resolve_under(self.first, "a.py")
+        safe, path = file_tools._check_path("a.py")
+        self.assertTrue(safe)
+        self.assertEqual(path, self.second / "a.py")
+
+    def test_file_index_of_other_checkout_is_not_reused(self) -> None:
+        create_file_tools(self.second)
+        # A walk still running for the first checkout stores its index late
+        file_tools._file_index.set(self.first, ["a.py"])
+        result = json.loads(search_files.invoke({"pattern": "**/*.py"}))
+        self.assertEqual(result["files"], ["b.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
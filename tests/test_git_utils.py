@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from git import Repo
+
+from src.git_utils import stage_changes
+
+
+class StageChangesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.repo = Repo.init(self.root)
+        (self.root / ".gitignore").write_text(".env\nbuild/\n")
+
+    def staged(self) -> set[str]:
+        output = str(self.repo.git.diff("--cached", "--name-only"))
+        return set(output.splitlines())
+
+    def test_stages_given_paths(self) -> None:
+        (self.root / "a.txt").write_text("a\n")
+        (self.root / "b.txt").write_text("b\n")
+        stage_changes(self.repo, ["a.txt"])
+        self.assertEqual(self.staged(), {"a.txt"})
+
+    def test_skips_gitignored_paths(self) -> None:
+        (self.root / "a.txt").write_text("a\n")
+        (self.root / ".env").write_text("SECRET=1\n")
+        (self.root / "build").mkdir()
+        (self.root / "build" / "out.js").write_text("x\n")
+        stage_changes(self.repo, ["a.txt", ".env", "build/out.js"])
+        self.assertEqual(self.staged(), {"a.txt"})
+
+    def test_only_gitignored_paths(self) -> None:
+        (self.root / ".env").write_text("SECRET=1\n")
+        stage_changes(self.repo, [".env"])
+        self.assertEqual(self.staged(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()